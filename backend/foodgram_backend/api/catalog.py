@@ -0,0 +1,72 @@
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.utils.http import quote_etag
+
+from .serializers import IngredientUnitSerializer, TagSerializer
+from app.models import IngredientUnit, Tag
+
+REFRESH_INTERVAL = 5 * 60
+# Снимки в процессах обновляются независимо, поэтому клиент кеширует
+# ненадолго и дальше перепроверяет справочник по ETag.
+CATALOG_MAX_AGE = 60
+
+CatalogSnapshot = namedtuple(
+    'CatalogSnapshot', ['data', 'by_id', 'etag', 'built_at']
+)
+
+
+class Catalog:
+    """Версионированный снимок справочника в памяти процесса.
+
+    Снимок перестраивается по сигналам изменения моделей и не реже
+    раза в REFRESH_INTERVAL секунд, чтобы подхватить изменения из других
+    процессов. ETag считается по содержимому, поэтому совпадает во всех
+    процессах с одинаковыми данными.
+    """
+
+    def __init__(self, get_queryset, serializer_class):
+        self.get_queryset = get_queryset
+        self.serializer_class = serializer_class
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def build(self):
+        self.stale = False
+        data = self.serializer_class(self.get_queryset(), many=True).data
+        data = [dict(item) for item in data]
+        content = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        etag = quote_etag(hashlib.sha1(content.encode()).hexdigest())
+        self.snapshot = CatalogSnapshot(
+            data=data,
+            by_id={item['id']: item for item in data},
+            etag=etag,
+            built_at=time.monotonic()
+        )
+        return self.snapshot
+
+    def get(self):
+        snapshot = self.snapshot
+        if snapshot and not self.stale and (
+                time.monotonic() - snapshot.built_at < REFRESH_INTERVAL):
+            return snapshot
+        with self.lock:
+            if self.snapshot is snapshot:
+                return self.build()
+            return self.snapshot
+
+
+tag_catalog = Catalog(lambda: Tag.objects.order_by('id'), TagSerializer)
+ingredient_catalog = Catalog(
+    lambda: IngredientUnit.objects.select_related(
+        'name', 'measurement_unit'
+    ).order_by('id'),
+    IngredientUnitSerializer
+)
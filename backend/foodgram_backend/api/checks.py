@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Предупреждаем о кеше в памяти процесса при нескольких воркерах."""
+    if (settings.CACHES['default']['BACKEND'] != LOCMEM_BACKEND
+            or settings.WEB_CONCURRENCY <= 1):
+        return []
+    return [Warning(
+        'LocMemCache не общий для воркеров: сброс ленты и журнал индекса '
+        'подборки видит только записавший процесс.',
+        hint='Укажите общий кеш в CACHE_BACKEND и CACHE_LOCATION.',
+        id='api.W001',
+    )]
@@ -0,0 +1,321 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from fractions import Fraction
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .feed_cache import increment
+from app.models import Recipe
+
+VERSION_KEY = 'cook_index:version'
+CHANGE_KEY = 'cook_index:change:{}'
+CHANGE_TIMEOUT = 60 * 60
+FULL_REBUILD = 'all'
+# При большем отставании журнала быстрее перестроить индекс целиком.
+MAX_REPLAY = 1000
+# Кеш по умолчанию свой у каждого процесса, и журнал из него видят не
+# все воркеры, поэтому индекс периодически перестраивается целиком.
+REFRESH_INTERVAL = 5 * 60
+LOAD_BATCH_SIZE = 10000
+# Беззнаковые 32-битные числа: id рецептов и ингредиентов в них помещаются.
+TYPECODE = 'I'
+# Ингредиент из рецептов чаще чем 1 на DENSE_RATIO храним битовой маской:
+# она тогда не больше массива id, а складывается без цикла в Python.
+DENSE_RATIO = 32
+
+CookMatch = namedtuple('CookMatch', ['recipe_id', 'matched', 'total'])
+IndexState = namedtuple(
+    'IndexState', ['postings', 'bitsets', 'sizes', 'recipe_units']
+)
+EMPTY_STATE = IndexState({}, {}, {}, {})
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+def record_changes(recipe_ids=None):
+    """Пишем изменение рецептов в журнал индекса после коммита.
+
+    Без recipe_ids индекс во всех процессах перестроится целиком.
+    """
+    changes = FULL_REBUILD if recipe_ids is None else list(recipe_ids)
+
+    def record():
+        version = increment(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), changes, CHANGE_TIMEOUT)
+
+    transaction.on_commit(record)
+
+
+def load_units(recipe_ids=None):
+    """Ингредиенты рецептов из БД: {id рецепта: множество IngredientUnit}."""
+    rows = Recipe.ingredient.through.objects.values_list(
+        'recipe_id', 'recipeingredient__ingredient_id'
+    )
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    units = defaultdict(set)
+    for recipe_id, unit_id in rows.iterator(LOAD_BATCH_SIZE):
+        units[recipe_id].add(unit_id)
+    return units
+
+
+def to_bitset(recipe_ids):
+    """Битовая маска из отсортированного массива id."""
+    if not recipe_ids:
+        return 0
+    bitmap = bytearray((recipe_ids[-1] >> 3) + 1)
+    for recipe_id in recipe_ids:
+        bitmap[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(bitmap, 'little')
+
+
+def add_bitset(slices, bits):
+    """Прибавляем по единице рецептам из bits.
+
+    Счётчики совпадений хранятся поразрядно: slices[i] - маска рецептов,
+    у которых в счётчике установлен i-й бит. Сложение идёт как в
+    двоичном сумматоре, операциями над целыми масками.
+    """
+    for position, bit_slice in enumerate(slices):
+        slices[position] = bit_slice ^ bits
+        bits &= bit_slice
+        if not bits:
+            return
+    slices.append(bits)
+
+
+def count_bits(bits):
+    return bin(bits).count('1')
+
+
+def toggle(masks, key, recipe_id):
+    masks[key] = masks.get(key, 0) ^ (1 << recipe_id)
+
+
+class CookResult:
+    """Ленивая выдача подборки для пагинатора.
+
+    Рецепты разбиты на упорядоченные группы с одинаковыми долей и числом
+    недостающих ингредиентов. Группа состоит из масок рецептов с равным
+    числом совпавших и всех ингредиентов: при полном совпадении это,
+    например, и 3 из 3, и 5 из 5. Id внутри группы достаём от старших
+    битов к младшим, то есть сначала новые рецепты, и только для
+    запрошенной страницы.
+    """
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.counts = [
+            sum(count_bits(bits) for _, _, bits in parts) for parts in groups
+        ]
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        result = []
+        for parts, count in zip(self.groups, self.counts):
+            if stop <= 0:
+                break
+            if start >= count:
+                start -= count
+                stop -= count
+                continue
+            parts = [list(part) for part in parts]
+            for position in range(min(count, stop)):
+                part = max(parts, key=lambda part: part[2].bit_length())
+                matched, total, bits = part
+                recipe_id = bits.bit_length() - 1
+                part[2] = bits ^ (1 << recipe_id)
+                if position >= start:
+                    result.append(CookMatch(recipe_id, matched, total))
+            start = 0
+            stop -= count
+        return result
+
+
+class CookIndex:
+    """Обратный индекс ингредиент - рецепты в памяти процесса.
+
+    Редкие ингредиенты хранят отсортированный массив id рецептов, частые -
+    битовую маску; для каждого числа ингредиентов в рецепте держим маску
+    таких рецептов. Совпадения считаем поразрядным сложением масок
+    вместо JOIN и GROUP BY в БД. Изменения рецептов попадают в журнал в
+    кеше под номером версии, по нему процесс обновляет только затронутые
+    рецепты. Изменения, сделанные в других процессах при кеше в памяти
+    процесса, подхватываются полной перестройкой раз в REFRESH_INTERVAL
+    секунд.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.built_at = None
+        self.state = EMPTY_STATE
+
+    def build(self, version):
+        """Строим индекс заново и подменяем его одним присваиванием."""
+        recipe_units = load_units()
+        unit_recipes = defaultdict(list)
+        size_recipes = defaultdict(list)
+        for recipe_id in sorted(recipe_units):
+            units = recipe_units[recipe_id]
+            size_recipes[len(units)].append(recipe_id)
+            for unit_id in units:
+                unit_recipes[unit_id].append(recipe_id)
+        capacity = max(recipe_units, default=0)
+        postings, bitsets = {}, {}
+        for unit_id, recipe_ids in unit_recipes.items():
+            recipe_ids = array(TYPECODE, recipe_ids)
+            if len(recipe_ids) * DENSE_RATIO > capacity:
+                bitsets[unit_id] = to_bitset(recipe_ids)
+            else:
+                postings[unit_id] = recipe_ids
+        self.state = IndexState(
+            postings=postings,
+            bitsets=bitsets,
+            sizes={
+                size: to_bitset(recipe_ids)
+                for size, recipe_ids in size_recipes.items()
+            },
+            recipe_units={
+                recipe_id: array(TYPECODE, sorted(units))
+                for recipe_id, units in recipe_units.items()
+            }
+        )
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def apply(self, recipe_ids):
+        """Перечитываем ингредиенты рецептов, удалённые убираем из индекса.
+
+        Меняем копии словарей и затронутых массивов, поэтому параллельный
+        поиск видит либо прежний индекс, либо новый целиком.
+        """
+        fresh = load_units(recipe_ids)
+        state = self.state
+        postings, bitsets = dict(state.postings), dict(state.bitsets)
+        sizes, recipe_units = dict(state.sizes), dict(state.recipe_units)
+        copied = set()
+
+        def get_unit_recipes(unit_id):
+            if unit_id not in copied:
+                copied.add(unit_id)
+                postings[unit_id] = array(
+                    TYPECODE, postings.get(unit_id, ())
+                )
+            return postings[unit_id]
+
+        for recipe_id in recipe_ids:
+            old_units = recipe_units.pop(recipe_id, ())
+            if old_units:
+                toggle(sizes, len(old_units), recipe_id)
+            for unit_id in old_units:
+                if unit_id in bitsets:
+                    toggle(bitsets, unit_id, recipe_id)
+                    continue
+                unit_recipes = get_unit_recipes(unit_id)
+                del unit_recipes[bisect_left(unit_recipes, recipe_id)]
+            units = fresh.get(recipe_id)
+            if not units:
+                continue
+            toggle(sizes, len(units), recipe_id)
+            for unit_id in units:
+                if unit_id in bitsets:
+                    toggle(bitsets, unit_id, recipe_id)
+                else:
+                    insort(get_unit_recipes(unit_id), recipe_id)
+            recipe_units[recipe_id] = array(TYPECODE, sorted(units))
+        self.state = IndexState(postings, bitsets, sizes, recipe_units)
+
+    def get_changes(self, version):
+        """Id рецептов из журнала между версиями или None для перестройки."""
+        if self.version is None or not (
+                0 < version - self.version <= MAX_REPLAY):
+            return None
+        keys = [
+            CHANGE_KEY.format(number)
+            for number in range(self.version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys) or FULL_REBUILD in changes.values():
+            return None
+        return set().union(*changes.values())
+
+    def is_expired(self):
+        return self.built_at is None or (
+            time.monotonic() - self.built_at >= REFRESH_INTERVAL)
+
+    def ensure_fresh(self):
+        version = get_version()
+        if version == self.version and not self.is_expired():
+            return
+        # Пока другой поток обновляет индекс, отвечаем по текущему.
+        if not self.lock.acquire(blocking=self.version is None):
+            return
+        try:
+            if self.is_expired():
+                self.build(version)
+            elif version != self.version:
+                recipe_ids = self.get_changes(version)
+                if recipe_ids is None:
+                    self.build(version)
+                else:
+                    self.apply(recipe_ids)
+                    self.version = version
+        finally:
+            self.lock.release()
+
+    def count_matches(self, state, unit_ids):
+        """Поразрядные счётчики выбранных ингредиентов в рецептах."""
+        slices = []
+        for unit_id in set(unit_ids):
+            bits = state.bitsets.get(unit_id)
+            if bits is None:
+                bits = to_bitset(state.postings.get(unit_id))
+            if bits:
+                add_bitset(slices, bits)
+        return slices
+
+    def search(self, unit_ids, max_missing=None):
+        """Рецепты с выбранными ингредиентами.
+
+        Сначала рецепты с большей долей имеющихся ингредиентов, при
+        равной доле - с меньшим числом недостающих, затем новые.
+        """
+        self.ensure_fresh()
+        state = self.state
+        slices = self.count_matches(state, unit_ids)
+        groups = defaultdict(list)
+        for total, recipes in state.sizes.items():
+            for matched in range(1, min(total, (1 << len(slices)) - 1) + 1):
+                if max_missing is not None and total - matched > max_missing:
+                    continue
+                bits = recipes
+                for position, bit_slice in enumerate(slices):
+                    if matched >> position & 1:
+                        bits &= bit_slice
+                    else:
+                        bits &= ~bit_slice
+                    if not bits:
+                        break
+                if bits:
+                    key = (-Fraction(matched, total), total - matched)
+                    groups[key].append((matched, total, bits))
+        return CookResult([groups[key] for key in sorted(groups)])
+
+
+cook_index = CookIndex()
@@ -0,0 +1,67 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'recipe_feed:generation'
+HITS_KEY = 'recipe_feed:hits'
+MISSES_KEY = 'recipe_feed:misses'
+
+
+def increment(key):
+    """Атомарно увеличиваем счётчик в кеше, создавая его при отсутствии."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, None):
+            return 1
+        return cache.incr(key)
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def bump_generation():
+    """Делаем устаревшими все закешированные ответы ленты разом."""
+    increment(GENERATION_KEY)
+
+
+def make_key(request, action, pk=None):
+    """Ключ ответа: поколение, действие и нормализованные параметры."""
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    digest = hashlib.sha1(
+        f'{request.get_host()}|{params}'.encode()
+    ).hexdigest()
+    return f'recipe_feed:{get_generation()}:{action}:{pk}:{digest}'
+
+
+def load(key):
+    data = cache.get(key)
+    increment(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def store(key, data):
+    cache.set(key, data, settings.FEED_CACHE_TIMEOUT)
+
+
+def stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0,
+        'generation': get_generation(),
+        'timeout': settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from rest_framework.fields import FileField
+
+HEADER_SIZE = 8 * 1024
+
+
+class DeferredBase64ImageField(Base64FieldMixin, FileField):
+    """Картинка в base64 или файлом multipart без полной проверки Pillow.
+
+    Формат определяется по сигнатуре файла, а декодирование изображения
+    целиком выполняется фоновой задачей при построении вариантов.
+    """
+
+    ALLOWED_TYPES = Base64ImageField.ALLOWED_TYPES
+    INVALID_FILE_MESSAGE = _('Please upload a valid image.')
+    INVALID_TYPE_MESSAGE = _("The type of the image couldn't be determined.")
+    TOO_LARGE_MESSAGE = 'Размер картинки превышает {} байт.'
+
+    get_file_extension = Base64ImageField.get_file_extension
+
+    def check_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError(
+                self.TOO_LARGE_MESSAGE.format(settings.RECIPE_IMAGE_MAX_SIZE)
+            )
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            # Размер оцениваем до декодирования, чтобы не тратить память.
+            self.check_size(len(data) * 3 // 4)
+            return super().to_internal_value(data)
+        if data in self.EMPTY_VALUES:
+            return None
+        self.check_size(getattr(data, 'size', 0))
+        try:
+            header = data.read(HEADER_SIZE)
+            data.seek(0)
+        except AttributeError:
+            self.fail('invalid')
+        extension = self.get_file_extension(None, header)
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        data.name = f'{self.get_file_name(header)}.{extension}'
+        return FileField.to_internal_value(self, data)
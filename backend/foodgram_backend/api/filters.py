@@ -1,31 +1,39 @@
 import django_filters
 from django_filters import rest_framework as filters
 
-from app.models import IngredientUnit, Recipe
+from app.models import Recipe, Tag
+from app.search import search_recipes
 
-
-class IngredientFilter(filters.FilterSet):
-    """Кастомный фильтр для модели Ingredient."""
-
-    name = django_filters.CharFilter(
-        field_name='name__name',
-        lookup_expr='icontains'
-    )
-
-    class Meta:
-        model = IngredientUnit
-        fields = ('name',)
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-pub_date', '-id'),
+    'trending': ('-trending_score', '-pub_date', '-id'),
+}
 
 
 class RecipeFilter(filters.FilterSet):
     """Кастомный фильтр для модели Recipe."""
 
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tag__slug'
+    tags = django_filters.ModelMultipleChoiceFilter(
+        field_name='tag__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all()
     )
-    author = django_filters.AllValuesFilter(
+    author = django_filters.NumberFilter(
         field_name='author__id'
     )
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='filter_ordering'
+    )
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, явно заданный ordering важнее ранга."""
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Порядок по заранее посчитанным и проиндексированным полям."""
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
 
     class Meta:
         model = Recipe
@@ -0,0 +1,17 @@
+from django.db.models import Subquery
+
+from app.models import Subscription
+
+FEED_ORDERING = ('-pub_date', '-id')
+
+
+def filter_following(queryset, user):
+    """Рецепты авторов, на которых подписан пользователь.
+
+    Один запрос по индексу (author, -pub_date) с подзапросом подписок,
+    отдельно число подписок не считаем.
+    """
+    following = Subscription.objects.filter(user=user).values('following_id')
+    return queryset.filter(
+        author_id__in=Subquery(following)
+    ).order_by(*FEED_ORDERING)
@@ -0,0 +1,119 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import feed_cache
+from app.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants/'
+VARIANTS = {
+    'thumbnail': (400, 'JPEG', 'jpg'),
+    'detail': (1200, 'JPEG', 'jpg'),
+    'webp': (1200, 'WEBP', 'webp'),
+}
+QUALITY = 82
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='image-variants'
+            )
+    return _executor
+
+
+def media_url(name):
+    return settings.MEDIA_URL + str(name)
+
+
+def get_image_url(recipe, variant):
+    """Ссылка на вариант картинки, пока его нет - на оригинал."""
+    name = (recipe.image_variants or {}).get(variant)
+    return media_url(name or recipe.image)
+
+
+def get_image_urls(recipe):
+    urls = {'original': media_url(recipe.image)}
+    for variant in VARIANTS:
+        urls[variant] = get_image_url(recipe, variant)
+    return urls
+
+
+def render_variants(name):
+    """Декодируем оригинал и сохраняем уменьшенные копии."""
+    with default_storage.open(name) as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {}
+    for variant, (size, image_format, extension) in VARIANTS.items():
+        copy = image.copy()
+        copy.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        copy.save(buffer, image_format, quality=QUALITY, optimize=True)
+        path = f'{VARIANTS_DIR}{stem}_{variant}.{extension}'
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        variants[variant] = default_storage.save(
+            path, ContentFile(buffer.getvalue())
+        )
+    return variants
+
+
+def build_variants(recipe_id):
+    """Фоновая задача: строим варианты картинки рецепта.
+
+    Результат сохраняем, только если картинку не заменили за время
+    обработки, и сбрасываем кеш ленты, чтобы отдать новые ссылки.
+    """
+    name = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image', flat=True
+    ).first()
+    if not name:
+        return False
+    try:
+        variants = render_variants(name)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.exception('Не удалось обработать картинку %s', name)
+        return False
+    updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants
+    )
+    if updated:
+        feed_cache.bump_generation()
+    return bool(updated)
+
+
+def run_in_worker(recipe_id):
+    """Ошибки пула иначе теряются в Future, поэтому пишем их в лог."""
+    try:
+        build_variants(recipe_id)
+    except Exception:
+        logger.exception('Ошибка построения вариантов рецепта %s', recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """Ставим построение вариантов в очередь после коммита транзакции."""
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_worker, recipe.pk)
+    )
@@ -0,0 +1,64 @@
+import bisect
+import threading
+
+from .catalog import ingredient_catalog
+
+AUTOCOMPLETE_LIMIT = 20
+AUTOCOMPLETE_MAX_LIMIT = 100
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов в памяти процесса.
+
+    Справочник небольшой и меняется редко, поэтому держим его целиком:
+    префиксные совпадения ищем бинарным поиском, вхождения подстроки -
+    проходом по списку. Индекс строится из снимка справочника
+    ингредиентов и перестраивается вместе с ним.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.entries = ([], [])
+
+    def build(self, snapshot):
+        entries = sorted(
+            (item['name'].lower(), item['id'], item)
+            for item in snapshot.data
+        )
+        self.entries = (
+            [key for key, pk, item in entries],
+            [item for key, pk, item in entries]
+        )
+        self.snapshot = snapshot
+
+    def ensure_built(self):
+        snapshot = self.catalog.get()
+        if snapshot is self.snapshot:
+            return
+        with self.lock:
+            if snapshot is not self.snapshot:
+                self.build(snapshot)
+
+    def search(self, term, limit=AUTOCOMPLETE_LIMIT):
+        """Сначала ингредиенты, начинающиеся с term, затем содержащие его."""
+        self.ensure_built()
+        keys, items = self.entries
+        term = term.lower()
+        start = bisect.bisect_left(keys, term)
+        end = start
+        while end < len(keys) and end - start < limit and (
+                keys[end].startswith(term)):
+            end += 1
+        result = items[start:end]
+        if len(result) < limit:
+            for key, item in zip(keys, items):
+                if term in key and not key.startswith(term):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex(ingredient_catalog)
@@ -0,0 +1,106 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Накопительная гистограмма в духе Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {total}'
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_time = 0
+
+
+class Registry:
+    """Метрики запросов по представлениям.
+
+    Хранятся в памяти процесса: каждый воркер gunicorn отдаёт свои
+    значения, Prometheus различает их по адресу цели.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewMetrics)
+
+    def observe(self, view, method, status, duration, queries, sql_time):
+        with self.lock:
+            metrics = self.views[view]
+            metrics.requests[(method, status)] += 1
+            metrics.latency.observe(duration)
+            metrics.queries.observe(queries)
+            metrics.sql_time += sql_time
+
+    def render(self):
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = [
+                '# HELP foodgram_http_requests_total Обработанные запросы.',
+                '# TYPE foodgram_http_requests_total counter',
+            ]
+            for view, metrics in views:
+                for (method, status), count in sorted(
+                        metrics.requests.items()
+                ):
+                    lines.append(
+                        f'foodgram_http_requests_total{{view="{view}",'
+                        f'method="{method}",status="{status}"}} {count}'
+                    )
+            lines += [
+                '# HELP foodgram_http_request_duration_seconds '
+                'Время обработки запроса.',
+                '# TYPE foodgram_http_request_duration_seconds histogram',
+            ]
+            for view, metrics in views:
+                lines.extend(metrics.latency.lines(
+                    'foodgram_http_request_duration_seconds',
+                    f'view="{view}"'
+                ))
+            lines += [
+                '# HELP foodgram_db_queries_per_request '
+                'Число SQL-запросов на запрос.',
+                '# TYPE foodgram_db_queries_per_request histogram',
+            ]
+            for view, metrics in views:
+                lines.extend(metrics.queries.lines(
+                    'foodgram_db_queries_per_request', f'view="{view}"'
+                ))
+            lines += [
+                '# HELP foodgram_db_query_duration_seconds_total '
+                'Суммарное время SQL-запросов.',
+                '# TYPE foodgram_db_query_duration_seconds_total counter',
+            ]
+            for view, metrics in views:
+                lines.append(
+                    f'foodgram_db_query_duration_seconds_total'
+                    f'{{view="{view}"}} {metrics.sql_time:.6f}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,116 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TOP_QUERIES = 5
+
+current_collector = ContextVar('query_collector', default=None)
+
+
+class QueryCollector:
+    """Счётчик SQL-запросов и их времени в рамках одного HTTP-запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+
+def collect_queries(execute, sql, params, many, context):
+    """Обёртка execute для всех соединений.
+
+    Счётчик берётся из контекста запроса, поэтому запросы учитываются
+    и тогда, когда представление выполняется в другом потоке под ASGI.
+    """
+    collector = current_collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    return collector(execute, sql, params, many, context)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name
+
+
+class QueryMetricsMiddleware:
+    """Метрики задержки и SQL-запросов по каждому представлению.
+
+    В режиме DEBUG добавляет заголовок Server-Timing, медленные запросы
+    пишет в лог вместе с самыми частыми SQL - так видно N+1.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        collector = QueryCollector()
+        token = current_collector.set(collector)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.record(request, response, collector, start)
+
+    async def __acall__(self, request):
+        collector = QueryCollector()
+        token = current_collector.set(collector)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_collector.reset(token)
+        return self.record(request, response, collector, start)
+
+    def record(self, request, response, collector, start):
+        duration = time.perf_counter() - start
+        view = get_view_name(request)
+        registry.observe(view, request.method, response.status_code,
+                         duration, collector.count, collector.duration)
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f'db;dur={collector.duration * 1000:.1f};'
+                f'desc="{collector.count} queries", '
+                f'total;dur={duration * 1000:.1f}'
+            )
+        if duration * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, SQL: %d за %.0f мс. '
+                'Частые запросы:\n%s',
+                request.method, request.path, view, duration * 1000,
+                collector.count, collector.duration * 1000,
+                '\n'.join(
+                    f'{count} x {sql}'
+                    for sql, count in collector.statements.most_common(
+                        TOP_QUERIES
+                    )
+                )
+            )
+        return response
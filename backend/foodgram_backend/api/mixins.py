@@ -1,4 +1,12 @@
+from functools import wraps
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from rest_framework import mixins, permissions, viewsets
+from rest_framework.response import Response
 
 
 class ListRetrieveCreateViewSet(mixins.CreateModelMixin,
@@ -20,3 +28,104 @@ class ListRetrieveViewSet(mixins.RetrieveModelMixin,
 class ListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
 
     pass
+
+
+class CatalogViewMixin:
+    """Отдача справочника из снимка в памяти с ETag.
+
+    Last-Modified не отдаём: времени изменения у моделей справочника нет,
+    а время сборки снимка своё в каждом процессе.
+    """
+
+    catalog = None
+    catalog_max_age = None
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(request, lambda snapshot: snapshot.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        def get_item(snapshot):
+            try:
+                return snapshot.by_id[int(self.kwargs.get(self.lookup_field))]
+            except (KeyError, TypeError, ValueError):
+                raise Http404
+        return self.catalog_response(request, get_item)
+
+    def catalog_response(self, request, get_data):
+        """Отвечаем 304, если у клиента актуальная версия справочника."""
+        snapshot = self.catalog.get()
+        response = get_conditional_response(request, etag=snapshot.etag)
+        if response is None:
+            response = Response(get_data(snapshot))
+        response['ETag'] = snapshot.etag
+        patch_cache_control(
+            response, public=True, max_age=self.catalog_max_age
+        )
+        return response
+
+
+STREAM_BATCH_SIZE = 64 * 1024
+
+
+def render_view(view, request, *args, **kwargs):
+    """Вызываем синхронное представление и сразу рендерим ответ."""
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response = response.render()
+    return response
+
+
+def next_batch(chunks):
+    """Склеиваем фрагменты потока в пачку около STREAM_BATCH_SIZE."""
+    parts = []
+    size = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= STREAM_BATCH_SIZE:
+            break
+    return b''.join(parts)
+
+
+async def iterate_async(chunks):
+    """Асинхронная отдача синхронного потока без буферизации целиком.
+
+    Фрагменты читаются в потоке запроса, поэтому курсор БД, открытый
+    представлением, остаётся в своём соединении.
+    """
+    chunks = iter(chunks)
+    while True:
+        batch = await sync_to_async(next_batch)(chunks)
+        if not batch:
+            return
+        yield batch
+
+
+class AsyncViewMixin:
+    """Асинхронная точка входа для представления под ASGI.
+
+    DRF работает синхронно, поэтому само представление по-прежнему
+    выполняется через sync_to_async - так же Django запускает любое
+    синхронное представление под ASGI. Отличие в потоковых ответах:
+    синхронный итератор Django под ASGI читает в память целиком, а здесь
+    он отдаётся пачками. Асинхронные потоковые ответы есть в Django с
+    4.2, на более старых версиях представление остаётся синхронным.
+    """
+
+    @classmethod
+    def as_view(cls, *args, **kwargs):
+        view = super().as_view(*args, **kwargs)
+        if not settings.ASYNC_VIEWS or django.VERSION < (4, 2):
+            return view
+
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            response = await sync_to_async(render_view)(
+                view, request, *args, **kwargs
+            )
+            if response.streaming and not response.is_async:
+                response.streaming_content = iterate_async(
+                    response.streaming_content
+                )
+            return response
+        return async_view
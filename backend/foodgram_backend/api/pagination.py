@@ -0,0 +1,73 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .filters import RECIPE_ORDERINGS
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная выдача ленты рецептов без COUNT и OFFSET."""
+
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+
+
+class SubscribeCursorPagination(CursorPagination):
+    """Курсорная выдача подписок в порядке их оформления."""
+
+    ordering = ('-subscription_id',)
+    page_size_query_param = 'limit'
+
+
+class CustomSetPagination(PageNumberPagination):
+    """Постраничная выдача по page и limit.
+
+    Если задан cursor_pagination_class и в запросе есть параметр cursor
+    (для первой страницы - пустой), выдача переключается на курсорную.
+    """
+
+    page_size_query_param = 'limit'
+    cursor_pagination_class = None
+
+    def __init__(self):
+        self.cursor_pagination = None
+
+    def use_cursor_pagination(self, request):
+        return (self.cursor_pagination_class.cursor_query_param
+                in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        pagination_class = self.cursor_pagination_class
+        if pagination_class and self.use_cursor_pagination(request):
+            self.cursor_pagination = pagination_class()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipeSetPagination(CustomSetPagination):
+    """Лента подписок (feed=following) по умолчанию курсорная.
+
+    Курсор DRF позиционируется только по первому полю порядка. У
+    рейтингов (popular, trending) и ранга поиска значения часто
+    совпадают и меняются, курсор по ним вырождается в смещение, поэтому
+    для них остаётся постраничная выдача.
+    """
+
+    cursor_pagination_class = RecipeCursorPagination
+
+    def use_cursor_pagination(self, request):
+        if (request.query_params.get('ordering') in RECIPE_ORDERINGS
+                or request.query_params.get('search')):
+            return False
+        return (request.query_params.get('feed') == 'following'
+                or super().use_cursor_pagination(request))
+
+
+class SubscribeSetPagination(CustomSetPagination):
+
+    cursor_pagination_class = SubscribeCursorPagination
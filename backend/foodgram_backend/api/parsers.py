@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, DataAndFiles
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер картинки превышает допустимый.'
+    default_code = 'image_too_large'
+
+
+class ImageUploadParser(BaseParser):
+    """Тело запроса - сама картинка в бинарном виде.
+
+    Тело пишется кусками во временный файл на диске, так что память
+    воркера не зависит от размера картинки. Лимит проверяем и по
+    Content-Length, и по факту чтения - для chunked-запросов.
+    """
+
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = settings.RECIPE_IMAGE_MAX_SIZE
+        request = parser_context['request']
+        if int(request.META.get('CONTENT_LENGTH') or 0) > limit:
+            raise ImageTooLarge()
+        if stream is None:
+            raise ParseError('Пустое тело запроса.')
+        upload = TemporaryUploadedFile('image', media_type, 0, None)
+        size = 0
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            size += len(chunk)
+            if size > limit:
+                upload.close()
+                raise ImageTooLarge()
+            upload.write(chunk)
+        upload.size = size
+        upload.seek(0)
+        return DataAndFiles({}, {'image': upload})
@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsInternalOrAdmin(BasePermission):
+    """Доступ для администратора или сборщика метрик.
+
+    Адреса сборщика задаются в METRICS_ALLOWED_IPS, по умолчанию список
+    пуст и доступ есть только у администраторов.
+    """
+
+    def has_permission(self, request, view):
+        if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+            return True
+        return bool(request.user and request.user.is_staff)
@@ -0,0 +1,86 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+from .shopping_list import ingredient_line, render_pdf
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок с потоковой отдачей.
+
+    Сам по себе не регистрируется. Наследник задаёт media_type, format и
+    метод stream(ingredients) - генератор текстовых фрагментов документа,
+    который представление отдаёт через StreamingHttpResponse.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(self.stream(data)).encode(self.charset)
+
+
+class ShoppingListPDFRenderer(BaseRenderer):
+    """Список покупок в PDF, формат по умолчанию."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return render_pdf(data).read()
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок простым текстом, по ингредиенту на строку."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield ingredient_line(ingredient) + '\n'
+
+
+class Echo:
+    """Псевдо-файл, возвращающий записанную строку вместо буферизации."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name__name'],
+                ingredient['ingredient__measurement_unit__name'],
+                ingredient['total']
+            ))
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в JSON, массив объектов с ингредиентами."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name__name'],
+                'measurement_unit': ingredient[
+                    'ingredient__measurement_unit__name'
+                ],
+                'amount': ingredient['total']
+            }, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
@@ -1,11 +1,17 @@
 from django.contrib.auth import get_user_model
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
+from django.db.models import Q
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField, PrimaryKeyRelatedField
 
+from .fields import DeferredBase64ImageField
+from .images import get_image_url, get_image_urls, schedule_variants
+from .shopping_list import invalidate_shopping_lists
+from .viewer_state import get_viewer_state
+from app.counters import change_counter
 from app.models import (
     Tag, Ingredient, MeasurementUnit, IngredientUnit, RecipeIngredient,
-    Recipe, RecipeTag, Subscription, RecipeFavorite, RecipeCart
+    Recipe, RecipeTag, RecipeCart
 )
 
 User = get_user_model()
@@ -35,14 +41,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
 
     def subscribed_check(self, obj):
-        request = self.context.get('request', None)
-        if request:
-            user = request.user
-            if isinstance(user, User):
-                return Subscription.objects.filter(
-                    user=user, following=obj
-                ).exists()
-        return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        state = get_viewer_state(self.context.get('request'))
+        return state is not None and obj.id in state.following_ids
 
     def create(self, validated_data):
         user = User.objects.create_user(
@@ -127,7 +129,7 @@ class RecipeReadIngredientSerializer(serializers.ModelSerializer):
 class RecipePostIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для модели, связывающей ингредиенты и рецепты."""
 
-    id = PrimaryKeyRelatedField(queryset=IngredientUnit.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         fields = ('id', 'amount')
@@ -143,45 +145,67 @@ class RecipeReadOnlySerializer(serializers.ModelSerializer):
         many=True, read_only=True, source='ingredient'
     )
     image = serializers.SerializerMethodField('image_url')
+    image_variants = serializers.SerializerMethodField('image_variants_urls')
     is_favorited = serializers.SerializerMethodField('favorited_check')
     is_in_shopping_cart = serializers.SerializerMethodField('cart_check')
 
     class Meta:
         fields = ('tags', 'author', 'ingredients', 'name', 'text', 'image',
-                  'cooking_time', 'id', 'is_favorited', 'is_in_shopping_cart')
+                  'image_variants', 'cooking_time', 'id', 'is_favorited',
+                  'is_in_shopping_cart')
         model = Recipe
 
     def cart_check(self, obj):
-        request = self.context.get('request', None)
-        if request:
-            user = request.user
-            if isinstance(user, User):
-                return RecipeCart.objects.filter(
-                    user=user,
-                    recipe=obj
-                ).exists()
-        return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        state = get_viewer_state(self.context.get('request'))
+        return state is not None and obj.id in state.cart_ids
 
     def favorited_check(self, obj):
-        request = self.context.get('request', None)
-        if request:
-            user = request.user
-            if isinstance(user, User):
-                return RecipeFavorite.objects.filter(
-                    user=user,
-                    recipe=obj
-                ).exists()
-        return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        state = get_viewer_state(self.context.get('request'))
+        return state is not None and obj.id in state.favorite_ids
 
     def image_url(self, obj):
-        return '/media/' + str(obj.image)
+        """В списке отдаём миниатюру, в карточке рецепта - крупный вариант."""
+        view = self.context.get('view')
+        if view is not None and getattr(view, 'action', None) in (
+                'list', 'cook'):
+            return get_image_url(obj, 'thumbnail')
+        return get_image_url(obj, 'detail')
+
+    def image_variants_urls(self, obj):
+        return get_image_urls(obj)
+
+
+class CookQuerySerializer(serializers.Serializer):
+    """Параметры подборки рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class CookRecipeSerializer(RecipeReadOnlySerializer):
+    """Рецепт в подборке по имеющимся ингредиентам."""
+
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeReadOnlySerializer.Meta):
+        fields = RecipeReadOnlySerializer.Meta.fields + (
+            'matched', 'missing', 'coverage'
+        )
 
 
 class RecipePostSerializer(serializers.ModelSerializer):
     """Сериализатор для модели рецептов, изменение."""
 
     tags = PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
-    image = Base64ImageField()
+    image = DeferredBase64ImageField()
     author = SlugRelatedField(slug_field='username',
                               default=serializers.CurrentUserDefault(),
                               read_only=True)
@@ -190,33 +214,102 @@ class RecipePostSerializer(serializers.ModelSerializer):
         source='ingredient'
     )
 
+    def validate_ingredients(self, value):
+        """Проверяем все ингредиенты одним запросом, а не по одному."""
+        ids = {ingredient['id'] for ingredient in value}
+        missing = ids - IngredientUnit.objects.in_bulk(ids).keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(str(pk) for pk in sorted(missing))
+            )
+        return value
+
+    def get_ingredient_ids(self, ingredients_data):
+        """Находим или создаём строки ингредиентов с количеством.
+
+        Строки уникальны по паре ингредиент-количество и общие для всех
+        рецептов, поэтому недостающие создаём одним запросом.
+        """
+        pairs = {
+            (ingredient['id'], ingredient['amount'])
+            for ingredient in ingredients_data
+        }
+        if not pairs:
+            return set()
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(ingredient_id=ingredient_id, amount=amount)
+             for ingredient_id, amount in pairs],
+            ignore_conflicts=True
+        )
+        query = Q()
+        for ingredient_id, amount in pairs:
+            query |= Q(ingredient_id=ingredient_id, amount=amount)
+        return set(
+            RecipeIngredient.objects.filter(query).values_list('id', flat=True)
+        )
+
+    def set_ingredients(self, recipe, ingredients_data, current_ids=()):
+        """Приводим ингредиенты рецепта к новому набору по разнице."""
+        through = Recipe.ingredient.through
+        new_ids = self.get_ingredient_ids(ingredients_data)
+        removed_ids = set(current_ids) - new_ids
+        if removed_ids:
+            through.objects.filter(
+                recipe=recipe, recipeingredient_id__in=removed_ids
+            ).delete()
+        through.objects.bulk_create([
+            through(recipe=recipe, recipeingredient_id=ingredient_id)
+            for ingredient_id in new_ids - set(current_ids)
+        ])
+
+    def set_tags(self, recipe, tags_data, current_ids=()):
+        """Приводим теги рецепта к новому набору по разнице."""
+        new_ids = {tag.id for tag in tags_data}
+        removed_ids = set(current_ids) - new_ids
+        if removed_ids:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=removed_ids
+            ).delete()
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in new_ids - set(current_ids)
+        ])
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredient')
         tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient in ingredients_data:
-            ing = RecipeIngredient.objects.create(
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
-            recipe.ingredient.add(ing)
-        for tag in tags_data:
-            RecipeTag.objects.create(recipe=recipe, tag=tag)
+        change_counter(User, recipe.author_id, 'recipes_count', 1)
+        self.set_ingredients(recipe, ingredients_data)
+        self.set_tags(recipe, tags_data)
+        schedule_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('ingredient')
-        tags_data = validated_data.pop('tags')
-        super().update(instance, validated_data)
-        recipe = instance
-        recipe.ingredient.select_related().all().delete()
-        RecipeTag.objects.filter(recipe=recipe).delete()
-        for ingredient in ingredients_data:
-            ing = RecipeIngredient.objects.create(
-                ingredient=ingredient['id'],
-                amount=ingredient['amount'])
-            recipe.ingredient.add(ing)
-        for tag in tags_data:
-            RecipeTag.objects.create(recipe=recipe, tag=tag)
+        ingredients_data = validated_data.pop('ingredient', None)
+        tags_data = validated_data.pop('tags', None)
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+            schedule_variants(instance)
+        recipe = super().update(instance, validated_data)
+        if ingredients_data is not None:
+            self.set_ingredients(
+                recipe, ingredients_data,
+                recipe.ingredient.values_list('id', flat=True)
+            )
+        if tags_data is not None:
+            self.set_tags(
+                recipe, tags_data,
+                recipe.tags.values_list('tag_id', flat=True)
+            )
+        invalidate_shopping_lists(
+            RecipeCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True
+            )
+        )
         return recipe
 
     class Meta:
@@ -233,7 +326,7 @@ class SubscribeRecipeSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField('image_url')
 
     def image_url(self, obj):
-        return '/media/' + str(obj.image)
+        return get_image_url(obj, 'thumbnail')
 
     class Meta:
         fields = ('id', 'name', 'image', 'cooking_time')
@@ -244,20 +337,20 @@ class SubscribeListSerializer(serializers.ModelSerializer):
     """Сериализатор для подписок."""
 
     recipes = serializers.SerializerMethodField('get_recipes')
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True
-    )
+    recipes_count = serializers.SerializerMethodField('get_recipes_count')
     is_subscribed = serializers.SerializerMethodField('subscribed_check')
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get('recipes_limit')
-        if recipes_limit:
-            queryset = obj.recipes.all()[:recipes_limit]
-        else:
-            queryset = obj.recipes.all()
-        serializer = SubscribeRecipeSerializer(queryset, many=True)
+        """Превью, ограниченное recipes_limit, готовит список подписок."""
+        recipes = getattr(obj, 'preview_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+        serializer = SubscribeRecipeSerializer(recipes, many=True)
         return serializer.data
 
+    def get_recipes_count(self, obj):
+        return obj.recipes_count
+
     def subscribed_check(self, obj):
         return True
 
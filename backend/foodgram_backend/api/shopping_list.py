@@ -0,0 +1,147 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from app.models import RecipeCart, RecipeIngredient
+
+FONT_NAME = 'FreeSans'
+FONT_FILE = os.path.join(settings.BASE_DIR, 'FreeSans.ttf')
+PAGE_TOP = 800
+PAGE_BOTTOM = 40
+LEFT_MARGIN = 15
+LINE_HEIGHT = 15
+SPOOL_MAX_SIZE = 1024 * 1024
+CACHE_TIMEOUT = 60 * 60 * 24
+CACHE_MAX_SIZE = 1024 * 1024
+EXPORT_FORMATS = ('pdf', 'txt', 'csv', 'json')
+
+
+def register_fonts():
+    """Регистрируем шрифт для PDF один раз при старте приложения."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+
+def get_ingredients(user):
+    """Суммарное количество ингредиентов из рецептов в корзине."""
+    return RecipeIngredient.objects.filter(
+        recipes__recipecart__user=user
+    ).values(
+        'ingredient__name__name', 'ingredient__measurement_unit__name'
+    ).annotate(
+        total=Sum('amount')
+    ).order_by('ingredient__name__name')
+
+
+def get_cart_digest(user):
+    """Хеш содержимого корзины: рецепты и привязанные к ним ингредиенты.
+
+    Строки RecipeIngredient уникальны по паре ингредиент-количество
+    и не меняются, поэтому их id достаточно, чтобы отличить старую
+    версию рецепта.
+    """
+    rows = RecipeCart.objects.filter(user=user).order_by(
+        'recipe_id', 'recipe__ingredient'
+    ).values_list('recipe_id', 'recipe__ingredient')
+    digest = hashlib.sha1(str(user.id).encode())
+    for recipe_id, ingredient_id in rows.iterator():
+        digest.update(f':{recipe_id}-{ingredient_id}'.encode())
+    return digest.hexdigest()
+
+
+def cache_key(user_id, export_format):
+    return f'shopping_list:{user_id}:{export_format}'
+
+
+def invalidate_shopping_lists(user_ids):
+    """Удаляем из кеша готовые списки покупок пользователей."""
+    cache.delete_many([
+        cache_key(user_id, export_format)
+        for user_id in user_ids
+        for export_format in EXPORT_FORMATS
+    ])
+
+
+def cache_stream(key, etag, chunks, charset):
+    """Отдаём фрагменты документа, попутно собирая его для кеша.
+
+    Документы больше CACHE_MAX_SIZE не кешируются.
+    """
+    parts = []
+    size = 0
+    for chunk in chunks:
+        yield chunk
+        if parts is None:
+            continue
+        chunk = chunk.encode(charset)
+        size += len(chunk)
+        if size > CACHE_MAX_SIZE:
+            parts = None
+            continue
+        parts.append(chunk)
+    if parts is not None:
+        cache.set(key, (etag, b''.join(parts)), CACHE_TIMEOUT)
+
+
+def ingredient_line(ingredient):
+    """Строка списка покупок для одного агрегированного ингредиента."""
+    line = (f'{ingredient["ingredient__name__name"]} '
+            f'({ingredient["ingredient__measurement_unit__name"]})'
+            f' - {ingredient["total"]}')
+    return line.capitalize()
+
+
+class ShoppingListPDF:
+    """Постраничная отрисовка списка покупок в PDF."""
+
+    def __init__(self, output):
+        self.canvas = canvas.Canvas(output)
+        self.line = PAGE_TOP
+        self.font_size = None
+
+    def skip(self, height):
+        """Сдвигаем курсор вниз без отрисовки."""
+        self.line -= height
+
+    def draw(self, text, font_size=12, height=LINE_HEIGHT):
+        """Выводим строку, перенося её на новую страницу при нехватке места."""
+        self.line -= height
+        if self.line < PAGE_BOTTOM:
+            self.canvas.showPage()
+            self.line = PAGE_TOP
+            self.font_size = None
+        if font_size != self.font_size:
+            self.canvas.setFont(FONT_NAME, font_size)
+            self.font_size = font_size
+        self.canvas.drawString(LEFT_MARGIN, self.line, text)
+
+    def save(self):
+        self.canvas.showPage()
+        self.canvas.save()
+
+
+def render_pdf(ingredients):
+    """Формируем PDF во временном файле, готовом к потоковой отдаче.
+
+    Небольшие документы остаются в памяти, большие сбрасываются на диск.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    document = ShoppingListPDF(output)
+    document.draw('Список покупок для выбранных рецептов:', 16, height=0)
+    document.skip(45)
+    for ingredient in ingredients:
+        document.draw(ingredient_line(ingredient))
+    document.skip(40)
+    document.draw(
+        'Список сгенерирован сервисом Продуктовый Помощник.', 14
+    )
+    document.draw('Автор: Андрей Федотов.', 12, height=20)
+    document.save()
+    output.seek(0)
+    return output
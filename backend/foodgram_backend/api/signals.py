@@ -0,0 +1,113 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from . import feed_cache
+from .catalog import ingredient_catalog, tag_catalog
+from .cook_index import record_changes
+from .middleware import collect_queries
+from app.search import update_search_index
+from app.models import (
+    Ingredient, IngredientUnit, MeasurementUnit, Recipe, RecipeIngredient,
+    RecipeTag, Tag
+)
+
+User = get_user_model()
+
+
+@receiver(connection_created)
+def install_query_collector(connection, **kwargs):
+    """Подключаем учёт SQL-запросов для метрик к каждому соединению."""
+    if collect_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(collect_queries)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_catalog(**kwargs):
+    """Перестраиваем снимок тегов при изменении справочника."""
+    tag_catalog.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=IngredientUnit)
+@receiver([post_save, post_delete], sender=MeasurementUnit)
+def invalidate_ingredient_catalog(**kwargs):
+    """Перестраиваем снимок ингредиентов и индекс автодополнения."""
+    ingredient_catalog.invalidate()
+
+
+def update_recipe_indexes(recipe_ids):
+    """Обновляем индекс подборки и поисковые документы рецептов.
+
+    Оба читают ингредиенты уже после коммита транзакции: API пишет их
+    в промежуточную таблицу пакетно и без m2m_changed.
+    """
+    recipe_ids = list(recipe_ids)
+    record_changes(recipe_ids)
+    transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def update_recipe(instance, **kwargs):
+    """Запись рецепта из API, админки или ORM и его удаление.
+
+    Удаление каскадом, например вместе с автором, тоже приходит сюда.
+    """
+    update_recipe_indexes([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.ingredient.through)
+def update_recipe_ingredients(instance, action, reverse, pk_set, **kwargs):
+    """Прямые изменения recipe.ingredient и обратной связи recipes."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        update_recipe_indexes([instance.pk])
+    elif action == 'pre_clear':
+        update_recipe_indexes(instance.recipes.values_list('id', flat=True))
+    else:
+        update_recipe_indexes(pk_set)
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def remove_recipe_ingredient(instance, **kwargs):
+    """Каскад удалит строки промежуточной таблицы без сигналов.
+
+    Рецепты запоминаем до удаления, после него связей уже нет.
+    """
+    update_recipe_indexes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=IngredientUnit)
+def rebuild_cook_index(**kwargs):
+    """Каскад удаляет строки ингредиентов без сигналов о рецептах."""
+    record_changes()
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeTag)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=IngredientUnit)
+@receiver([post_save, post_delete], sender=MeasurementUnit)
+@receiver(m2m_changed, sender=Recipe.ingredient.through)
+def invalidate_feed_cache(**kwargs):
+    """Сбрасываем кеш ленты после фиксации изменений рецептов.
+
+    Сброс откладываем до коммита, иначе параллельный запрос успеет
+    закешировать старые данные под новым поколением.
+    """
+    transaction.on_commit(feed_cache.bump_generation)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_feed_cache_on_author(update_fields=None, **kwargs):
+    """Данные авторов есть в ленте, но вход в систему её не меняет."""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(feed_cache.bump_generation)
@@ -0,0 +1,87 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from app.models import (
+    Ingredient, IngredientUnit, MeasurementUnit, Recipe, RecipeCart,
+    RecipeFavorite, RecipeIngredient, Subscription, Tag
+)
+from users.models import CustomUser
+
+RECIPES_COUNT = 30
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='reader', email='reader@example.com', password='pass',
+            first_name='Читатель', last_name='Рецептов'
+        )
+        authors = [
+            CustomUser.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='pass',
+                first_name='Автор', last_name=str(number)
+            )
+            for number in range(3)
+        ]
+        Subscription.objects.create(user=cls.user, following=authors[0])
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', slug=f'tag{number}',
+                color=f'#00000{number}'
+            )
+            for number in range(2)
+        ]
+        unit = MeasurementUnit.objects.create(name='г')
+        ingredients = [
+            RecipeIngredient.objects.create(
+                ingredient=IngredientUnit.objects.create(
+                    name=Ingredient.objects.create(name=f'Продукт {number}'),
+                    measurement_unit=unit
+                ),
+                amount=number + 1
+            )
+            for number in range(3)
+        ]
+        for number in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/images/test.png', cooking_time=10
+            )
+            recipe.tag.set(tags)
+            recipe.ingredient.set(ingredients)
+            if number % 2:
+                RecipeFavorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                RecipeCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        # Ответы анонимным пользователям кешируются, а запросы нужны из БД.
+        cache.clear()
+
+    def count_queries(self, client, limit):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context)
+
+    def assert_constant_queries(self, client):
+        self.assertEqual(
+            self.count_queries(client, 5), self.count_queries(client, 25)
+        )
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant_queries(client)
@@ -5,7 +5,7 @@ from .views import (
     CustomUserViewSet, UsersMeApiView, ChangePasswordView, TagViewSet,
     IngredientViewSet, RecipeViewSet, SubscribePostDestroyView,
     SubscribeListViewSet, FavoritePostDestroyView, CartPostDestroyView,
-    CartDownloadView
+    CartDownloadView, FeedCacheStatsView, MetricsView
 )
 
 app_name = 'api'
@@ -35,5 +35,7 @@ urlpatterns = [
     path('recipes/download_shopping_cart/', CartDownloadView.as_view()),
     path('users/set_password/', ChangePasswordView.as_view()),
     path('users/me/', UsersMeApiView.as_view()),
+    path('cache_stats/', FeedCacheStatsView.as_view()),
+    path('metrics/', MetricsView.as_view()),
     path('', include(router_v1.urls)),
 ]
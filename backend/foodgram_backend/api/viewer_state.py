@@ -0,0 +1,44 @@
+from django.utils.functional import cached_property
+
+from app.models import RecipeCart, RecipeFavorite, Subscription
+
+
+class ViewerState:
+    """Подписки, избранное и корзина текущего пользователя.
+
+    Каждое множество загружается одним запросом при первом обращении
+    и дальше отвечает на проверки всех сериализаторов в рамках запроса.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def load_ids(self, model, field):
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(
+            model.objects.filter(user=self.user).values_list(field, flat=True)
+        )
+
+    @cached_property
+    def following_ids(self):
+        return self.load_ids(Subscription, 'following_id')
+
+    @cached_property
+    def favorite_ids(self):
+        return self.load_ids(RecipeFavorite, 'recipe_id')
+
+    @cached_property
+    def cart_ids(self):
+        return self.load_ids(RecipeCart, 'recipe_id')
+
+
+def get_viewer_state(request):
+    """Состояние пользователя, привязанное к объекту запроса."""
+    if request is None:
+        return None
+    state = getattr(request, 'viewer_state', None)
+    if state is None:
+        state = ViewerState(request.user)
+        request.viewer_state = state
+    return state
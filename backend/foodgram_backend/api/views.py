@@ -1,42 +1,65 @@
 import io
 
 from django.contrib.auth import get_user_model
-from django.http import FileResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import CreateAPIView
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .filters import IngredientFilter, RecipeFilter
+from . import feed_cache
+from .catalog import CATALOG_MAX_AGE, ingredient_catalog, tag_catalog
+from .cook_index import cook_index
+from .filters import RecipeFilter
+from .following_feed import filter_following
+from .ingredient_index import (
+    AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, ingredient_index
+)
+from .metrics import CONTENT_TYPE, registry
 from .mixins import (
-    ListRetrieveCreateViewSet, ListRetrieveViewSet, ListViewSet
+    AsyncViewMixin, CatalogViewMixin, ListRetrieveCreateViewSet,
+    ListRetrieveViewSet, ListViewSet
+)
+from .pagination import (
+    CustomSetPagination, RecipeSetPagination, SubscribeSetPagination
+)
+from .parsers import ImageUploadParser
+from .permissions import IsInternalOrAdmin
+from .renderers import (
+    ShoppingListPDFRenderer, ShoppingListTextRenderer,
+    ShoppingListCSVRenderer, ShoppingListJSONRenderer
 )
 from .serializers import (
     UserSerializer, ChangePasswordSerializer, TagSerializer,
-    IngredientUnitSerializer, RecipePostSerializer,
-    RecipeReadOnlySerializer, SubscribeListSerializer,
+    IngredientUnitSerializer, RecipePostSerializer, CookQuerySerializer,
+    CookRecipeSerializer, RecipeReadOnlySerializer, SubscribeListSerializer,
     SubscribeRecipeSerializer
 )
+from .shopping_list import (
+    CACHE_MAX_SIZE, CACHE_TIMEOUT, cache_key, cache_stream, get_cart_digest,
+    get_ingredients, invalidate_shopping_lists, render_pdf
+)
+from app.counters import change_counter
 from app.models import (
-    Tag, IngredientUnit, Recipe, Subscription, RecipeFavorite,
-    RecipeCart
+    Tag, IngredientUnit, Recipe, RecipeIngredient, Subscription,
+    RecipeFavorite, RecipeCart
 )
 
 User = get_user_model()
 
 
-class CustomSetPagination(PageNumberPagination):
-
-    page_size_query_param = 'limit'
-
-
 class CustomUserViewSet(ListRetrieveCreateViewSet):
     """View-set для эндпоинта users."""
 
@@ -90,27 +113,49 @@ class ChangePasswordView(CreateAPIView):
         return Response(response)
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(CatalogViewMixin, ListRetrieveViewSet):
     """Представление для эндпоинта Tag."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    catalog = tag_catalog
+    catalog_max_age = CATALOG_MAX_AGE
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(CatalogViewMixin, ListRetrieveViewSet):
     """Представление для эндпоинта Ингредиентов."""
 
-    filter_backends = (DjangoFilterBackend,)
-    filterset_fields = ('name',)
-    filterset_class = IngredientFilter
     queryset = IngredientUnit.objects.all()
     serializer_class = IngredientUnitSerializer
+    catalog = ingredient_catalog
+    catalog_max_age = CATALOG_MAX_AGE
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по name отдаём из индекса автодополнения.
+
+        Сначала идут ингредиенты, начинающиеся с введённой строки,
+        затем содержащие её; размер выдачи ограничен параметром limit.
+        """
+
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            limit = int(request.query_params.get('limit', ''))
+        except ValueError:
+            limit = AUTOCOMPLETE_LIMIT
+        if limit <= 0:
+            limit = AUTOCOMPLETE_LIMIT
+        limit = min(limit, AUTOCOMPLETE_MAX_LIMIT)
+        return self.catalog_response(
+            request, lambda snapshot: ingredient_index.search(name, limit)
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncViewMixin, viewsets.ModelViewSet):
     """Представление для эндпоинта Рецептов."""
 
-    pagination_class = CustomSetPagination
+    pagination_class = RecipeSetPagination
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadOnlySerializer
     permission_classes = [AllowAny]
@@ -125,30 +170,148 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipePostSerializer
         return RecipeReadOnlySerializer
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """Ответы анонимным пользователям отдаём из кеша ленты."""
+
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = feed_cache.make_key(request, self.action, kwargs.get('pk'))
+        data = feed_cache.load(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            feed_cache.store(key, response.data)
+        return response
+
     def perform_create(self, serializer):
         """Переопределяем сохранение автора рецепта."""
 
         author = self.request.user
         serializer.save(author=author)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """Удаляем рецепт и уменьшаем счётчик рецептов автора."""
+
+        author_id = instance.author_id
+        instance.delete()
+        change_counter(User, author_id, 'recipes_count', -1)
+
+    @action(detail=True, methods=['put'], url_path='image',
+            parser_classes=[ImageUploadParser],
+            permission_classes=[IsAuthenticated])
+    def image(self, request, pk=None):
+        """Замена картинки рецепта бинарным телом запроса."""
+
+        recipe = get_object_or_404(Recipe, pk=pk)
+        if recipe.author_id != request.user.id:
+            raise PermissionDenied('Менять картинку может только автор.')
+        upload = request.data['image']
+        try:
+            serializer = RecipePostSerializer(
+                recipe, data={'image': upload}, partial=True,
+                context=self.get_serializer_context()
+            )
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        finally:
+            # Файл вне request.FILES, Django сам его не закроет.
+            upload.close()
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='cook')
+    def cook(self, request):
+        """Рецепты из имеющихся ингредиентов по доле совпадения.
+
+        Ингредиенты - id из справочника, параметр ingredients можно
+        повторять или перечислить id через запятую. max_missing
+        ограничивает число недостающих ингредиентов.
+        """
+
+        values = ','.join(request.query_params.getlist('ingredients'))
+        data = {'ingredients': [value for value in values.split(',') if value]}
+        if 'max_missing' in request.query_params:
+            data['max_missing'] = request.query_params['max_missing']
+        query = CookQuerySerializer(data=data)
+        query.is_valid(raise_exception=True)
+        matches = cook_index.search(
+            query.validated_data['ingredients'],
+            query.validated_data.get('max_missing')
+        )
+        paginator = CustomSetPagination()
+        page = paginator.paginate_queryset(matches, request, self)
+        recipes = self.get_queryset().in_bulk(
+            [match.recipe_id for match in page]
+        )
+        results = []
+        for match in page:
+            recipe = recipes.get(match.recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = match.matched
+            recipe.missing = match.total - match.matched
+            recipe.coverage = round(match.matched / match.total, 3)
+            results.append(recipe)
+        serializer = CookRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
     def get_queryset(self):
-        """Фильтруем выборку рецептов, в зависимости от Query Params."""
-
-        if self.request.query_params.get('is_favorited') == '1':
-            user = self.request.user
-            favorites = RecipeFavorite.objects.filter(
-                user=user
-            ).values_list('recipe__id', flat=True)
-            queryset = Recipe.objects.filter(id__in=favorites)
-            return queryset
-        if self.request.query_params.get('is_in_shopping_cart') == '1':
-            user = self.request.user
-            in_cart = RecipeCart.objects.filter(
-                user=user
-            ).values_list('recipe__id', flat=True)
-            queryset = Recipe.objects.filter(id__in=in_cart)
-            return queryset
-        return Recipe.objects.all()
+        """Фильтруем выборку рецептов, в зависимости от Query Params.
+
+        Флаги текущего пользователя считаем аннотациями, а автора, теги
+        и ингредиенты подтягиваем prefetch-запросами, чтобы число
+        запросов не зависело от размера страницы.
+        """
+
+        user = self.request.user
+        authors = User.objects.all()
+        queryset = Recipe.objects.defer('search_vector').prefetch_related(
+            Prefetch('tag', queryset=Tag.objects.all()),
+            Prefetch(
+                'ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient__name', 'ingredient__measurement_unit'
+                )
+            )
+        )
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user, following=OuterRef('pk')
+                )
+            ))
+            queryset = queryset.annotate(
+                is_favorited=Exists(RecipeFavorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(RecipeCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                ))
+            )
+            if self.request.query_params.get('is_favorited') == '1':
+                queryset = queryset.filter(is_favorited=True)
+            if self.request.query_params.get('is_in_shopping_cart') == '1':
+                queryset = queryset.filter(is_in_shopping_cart=True)
+            if self.request.query_params.get('feed') == 'following':
+                queryset = filter_following(queryset, user)
+        elif (self.request.query_params.get('is_favorited') == '1'
+              or self.request.query_params.get('is_in_shopping_cart') == '1'
+              or self.request.query_params.get('feed') == 'following'):
+            queryset = queryset.none()
+        return queryset.prefetch_related(
+            Prefetch('author', queryset=authors)
+        )
 
 
 class SubscribePostDestroyView(APIView):
@@ -161,15 +324,17 @@ class SubscribePostDestroyView(APIView):
             return Response(
                 'Нельзя подписываться на самого себя!',
                 status=status.HTTP_400_BAD_REQUEST)
-        subscription, created = Subscription.objects.get_or_create(
-            user=user,
-            following=author
-        )
+        with transaction.atomic():
+            subscription, created = Subscription.objects.get_or_create(
+                user=user,
+                following=author
+            )
+            if created:
+                change_counter(User, author.id, 'followers_count', 1)
         if not created:
             return Response(
                 'Вы уже подписаны на данного автора!',
                 status=status.HTTP_400_BAD_REQUEST)
-        subscription.save()
         serializer = SubscribeListSerializer(author)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -179,31 +344,48 @@ class SubscribePostDestroyView(APIView):
             Subscription,
             user=self.request.user,
             following=author)
-        subscription.delete()
+        with transaction.atomic():
+            if subscription.delete()[0]:
+                change_counter(User, author.id, 'followers_count', -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class SubscribeListViewSet(ListViewSet):
+class SubscribeListViewSet(AsyncViewMixin, ListViewSet):
     """Представление для списка подписок."""
 
-    pagination_class = CustomSetPagination
+    pagination_class = SubscribeSetPagination
     permission_classes = [IsAuthenticated]
     serializer_class = SubscribeListSerializer
 
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return recipes_limit if recipes_limit > 0 else None
+
     def get_queryset(self):
+        """Авторов и превью их рецептов берём разом.
+
+        Число рецептов хранится в счётчике автора. Превью берём срезом
+        в Prefetch: Django ограничивает его оконной функцией, и одним
+        запросом приходят первые recipes_limit рецептов каждого автора
+        на странице. Срез нельзя положить в кеш менеджера recipes,
+        поэтому превью лежит в атрибуте preview_recipes.
+        """
+
         user = self.request.user
-        subs = user.follower.all().values_list('following__id', flat=True)
-        queryset = User.objects.filter(id__in=subs)
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit:
+            recipes = recipes[:recipes_limit]
+        queryset = User.objects.filter(follows__user=user).annotate(
+            subscription_id=F('follows__id')
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='preview_recipes')
+        ).order_by('-subscription_id')
         return queryset
 
-    def get_serializer_context(self):
-        context = super().get_serializer_context()
-        recipes_limit = self.request.query_params.get('recipes_limit')
-        if recipes_limit and recipes_limit.isnumeric():
-            context['recipes_limit'] = int(
-                self.request.query_params.get('recipes_limit'))
-        return context
-
 
 class FavoritePostDestroyView(APIView):
     """Представление для добавления и удаления из избранного."""
@@ -211,15 +393,17 @@ class FavoritePostDestroyView(APIView):
     def post(self, request, **kwargs):
         recipe = get_object_or_404(Recipe, id=self.kwargs["id"])
         user = self.request.user
-        favorite, created = RecipeFavorite.objects.get_or_create(
-            user=user,
-            recipe=recipe
-        )
+        with transaction.atomic():
+            favorite, created = RecipeFavorite.objects.get_or_create(
+                user=user,
+                recipe=recipe
+            )
+            if created:
+                change_counter(Recipe, recipe.id, 'favorites_count', 1)
         if not created:
             return Response('Данный рецепт уже в избранном!',
                             status=status.HTTP_400_BAD_REQUEST
                             )
-        favorite.save()
         serializer = SubscribeRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -227,7 +411,9 @@ class FavoritePostDestroyView(APIView):
         recipe = get_object_or_404(Recipe, id=self.kwargs["id"])
         favorite = get_object_or_404(RecipeFavorite, user=self.request.user,
                                      recipe=recipe)
-        favorite.delete()
+        with transaction.atomic():
+            if favorite.delete()[0]:
+                change_counter(Recipe, recipe.id, 'favorites_count', -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -237,15 +423,18 @@ class CartPostDestroyView(APIView):
     def post(self, request, **kwargs):
         recipe = get_object_or_404(Recipe, id=self.kwargs["id"])
         user = self.request.user
-        cart, created = RecipeCart.objects.get_or_create(
-            user=user,
-            recipe=recipe
-        )
+        with transaction.atomic():
+            cart, created = RecipeCart.objects.get_or_create(
+                user=user,
+                recipe=recipe
+            )
+            if created:
+                change_counter(Recipe, recipe.id, 'carts_count', 1)
         if not created:
             return Response('Данный рецепт уже в корзине!',
                             status=status.HTTP_400_BAD_REQUEST
                             )
-        cart.save()
+        invalidate_shopping_lists([user.id])
         serializer = SubscribeRecipeSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -253,51 +442,94 @@ class CartPostDestroyView(APIView):
         recipe = get_object_or_404(Recipe, id=self.kwargs["id"])
         cart = get_object_or_404(RecipeCart, user=self.request.user,
                                      recipe=recipe)
-        cart.delete()
+        with transaction.atomic():
+            if cart.delete()[0]:
+                change_counter(Recipe, recipe.id, 'carts_count', -1)
+        invalidate_shopping_lists([self.request.user.id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class CartDownloadView(APIView):
-    """Представление для формирования и скачивания списка покупок."""
+class CartDownloadView(AsyncViewMixin, APIView):
+    """Представление для формирования и скачивания списка покупок.
+
+    Формат выбирается по параметру format или заголовку Accept,
+    по умолчанию отдаём PDF.
+    """
+
+    renderer_classes = [
+        ShoppingListPDFRenderer, ShoppingListTextRenderer,
+        ShoppingListCSVRenderer, ShoppingListJSONRenderer
+    ]
 
     def get(self, request, **kwargs):
+        """Отдаём список покупок с учётом кеша и If-None-Match."""
 
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer)
-        line = 800
-        pdfmetrics.registerFont(TTFont('FreeSans', 'FreeSans.ttf'))
-        p.setFont('FreeSans', 16)
-        p.drawString(15, line, "Список покупок для выбранных рецептов:")
-        p.setFont('FreeSans', 12)
-        line -= 50
         user = self.request.user
-        in_cart = RecipeCart.objects.filter(user=user).values_list(
-            'recipe__id', flat=True)
-        queryset = Recipe.objects.filter(id__in=in_cart)
-        ingredients_dict = {}
-        for recipe in queryset:
-            ingredients = recipe.ingredient.all()
-            for ingredient in ingredients:
-                key = f'{str(ingredient.ingredient.name)}'
-                key += f' ({str(ingredient.ingredient.measurement_unit.name)})'
-                to_dict = ingredients_dict.get(key)
-                if to_dict:
-                    ingredients_dict[key] += ingredient.amount
-                else:
-                    ingredients_dict[key] = ingredient.amount
-        for ingredient, amount in ingredients_dict.items():
-            line -= 10
-            to_print = f'{ingredient} - {amount}'
-            p.drawString(15, line, to_print.capitalize())
-        line -= 55
-        p.setFont('FreeSans', 14)
-        p.drawString(
-            15, line, 'Список сгенерирован сервисом Продуктовый Помощник.'
+        renderer = request.accepted_renderer
+        etag = quote_etag(f'{get_cart_digest(user)}-{renderer.format}')
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            key = cache_key(user.id, renderer.format)
+            cached = cache.get(key)
+            if cached and cached[0] == etag:
+                response = HttpResponse(
+                    cached[1], content_type=self.get_content_type(renderer)
+                )
+            else:
+                response = self.render_shopping_list(renderer, key, etag)
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_list.{renderer.format}"'
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_content_type(self, renderer):
+        if renderer.charset:
+            return f'{renderer.media_type}; charset={renderer.charset}'
+        return renderer.media_type
+
+    def render_shopping_list(self, renderer, key, etag):
+        """Формируем документ заново и сохраняем его в кеш."""
+
+        ingredients = get_ingredients(self.request.user).iterator()
+        content_type = self.get_content_type(renderer)
+        if isinstance(renderer, ShoppingListPDFRenderer):
+            output = render_pdf(ingredients)
+            if output.seek(0, io.SEEK_END) <= CACHE_MAX_SIZE:
+                output.seek(0)
+                cache.set(key, (etag, output.read()), CACHE_TIMEOUT)
+            output.seek(0)
+            return FileResponse(output, content_type=content_type)
+        return StreamingHttpResponse(
+            cache_stream(key, etag, renderer.stream(ingredients),
+                         renderer.charset),
+            content_type=content_type
         )
-        line -= 20
-        p.setFont('FreeSans', 12)
-        p.drawString(15, line, 'Автор: Андрей Федотов.')
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True, filename='hello.pdf')
+
+    def handle_exception(self, exc):
+        """Ошибки отдаём в JSON, независимо от запрошенного формата."""
+
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+
+class FeedCacheStatsView(APIView):
+    """Счётчики попаданий в кеш ленты рецептов для настройки TTL."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(feed_cache.stats())
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus."""
+
+    permission_classes = [IsInternalOrAdmin]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
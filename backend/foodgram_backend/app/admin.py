@@ -16,9 +16,10 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ['author__username', 'name', 'tag__name']
     empty_value_display = '-пусто-'
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorites(self, obj):
         """Столбец с отображением числа добавлений в избранное рецепта."""
-        return RecipeFavorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,53 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Recipe, RecipeCart, RecipeFavorite, Subscription
+from users.models import CustomUser
+
+REPAIR_BATCH_SIZE = 1000
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняем счётчик в БД, не опускаясь ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом строк model, ссылающихся на текущую запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', RecipeFavorite, 'recipe'),
+    (Recipe, 'carts_count', RecipeCart, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Subscription, 'following'),
+)
+
+
+def repair_counters(dry_run=False):
+    """Пересчитываем счётчики и исправляем расхождения.
+
+    Обновляются только записи с разошедшимся значением, возвращаем
+    их число по каждому счётчику.
+    """
+    drift = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = count_subquery(related_model, related_field)
+        ids = list(model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}
+        ).values_list('pk', flat=True))
+        drift[f'{model._meta.model_name}.{field}'] = len(ids)
+        if dry_run:
+            continue
+        for start in range(0, len(ids), REPAIR_BATCH_SIZE):
+            model.objects.filter(
+                pk__in=ids[start:start + REPAIR_BATCH_SIZE]
+            ).update(**{field: actual})
+    return drift
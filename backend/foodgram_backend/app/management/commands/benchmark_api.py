@@ -0,0 +1,163 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from app.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+SCENARIOS = (
+    'recipes_anonymous', 'recipes_authenticated', 'recipes_by_tags',
+    'recipe_detail', 'subscriptions', 'favorite_toggle', 'cart_toggle',
+    'shopping_list_pdf', 'shopping_list_txt', 'ingredient_search',
+    'what_can_i_cook',
+)
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон основных эндпоинтов API: задержки '
+            'p50/p90/p99, число SQL-запросов и пропускная способность. '
+            'Данные готовятся командой generate_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS,
+                            help='Запустить только указанные сценарии.')
+        parser.add_argument('--output', type=str,
+                            help='Сохранить результаты в JSON-файл.')
+        parser.add_argument('--compare', type=str,
+                            help='JSON-файл прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            follows_count=Count('follower')
+        ).filter(follows_count__gt=0).order_by('-follows_count').first()
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        if user is None or recipe is None:
+            raise CommandError('Нет данных, запустите generate_data.')
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.recipe = recipe
+        self.tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        term = Ingredient.objects.values_list('name', flat=True).first()
+        if term is None:
+            raise CommandError('Нет ингредиентов, запустите import_data.')
+        self.term = term[:3]
+        self.pantry = ','.join(
+            str(unit_id) for unit_id in recipe.ingredient.values_list(
+                'ingredient_id', flat=True
+            )
+        )
+        results = {}
+        for scenario in options['scenario'] or SCENARIOS:
+            results[scenario] = self.run(
+                getattr(self, scenario), options['iterations']
+            )
+        baseline = self.load(options['compare']) if options['compare'] else {}
+        for scenario, result in results.items():
+            line = (
+                f'{scenario:<24} p50 {result["p50"]:8.2f} мс  '
+                f'p90 {result["p90"]:8.2f} мс  p99 {result["p99"]:8.2f} мс  '
+                f'SQL {result["queries"]:5.1f}  {result["rps"]:7.1f} rps'
+            )
+            if scenario in baseline:
+                change = result['p50'] / baseline[scenario]['p50'] - 1
+                line += f'  p50 {change:+.0%}'
+            self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def run(self, scenario, iterations):
+        """Прогоняем сценарий, первый вызов прогревает кеши и не считается."""
+        scenario()
+        timings, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                scenario()
+                timings.append(time.perf_counter() - start)
+            queries.append(len(context.captured_queries))
+        timings.sort()
+        return {
+            'p50': percentile(timings, 0.5) * 1000,
+            'p90': percentile(timings, 0.9) * 1000,
+            'p99': percentile(timings, 0.99) * 1000,
+            'queries': statistics.mean(queries),
+            'rps': len(timings) / sum(timings),
+        }
+
+    def request(self, client, method, path, status=200, **params):
+        response = getattr(client, method)(path, params)
+        if status and response.status_code != status:
+            raise CommandError(
+                f'{method.upper()} {path}: {response.status_code}'
+            )
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def recipes_anonymous(self):
+        self.request(self.anonymous, 'get', '/api/recipes/')
+
+    def recipes_authenticated(self):
+        self.request(self.client, 'get', '/api/recipes/')
+
+    def recipes_by_tags(self):
+        self.request(self.client, 'get', '/api/recipes/', tags=self.tags)
+
+    def recipe_detail(self):
+        self.request(self.client, 'get', f'/api/recipes/{self.recipe.id}/')
+
+    def subscriptions(self):
+        self.request(self.client, 'get', '/api/users/subscriptions/',
+                     recipes_limit=3)
+
+    def toggle(self, action):
+        """Добавляем и удаляем рецепт, возвращая исходное состояние."""
+        path = f'/api/recipes/{self.recipe.id}/{action}/'
+        response = self.request(self.client, 'post', path, status=None)
+        self.request(self.client, 'delete', path, status=204)
+        if response.status_code != 201:
+            self.request(self.client, 'post', path, status=201)
+
+    def favorite_toggle(self):
+        self.toggle('favorite')
+
+    def cart_toggle(self):
+        self.toggle('shopping_cart')
+
+    def shopping_list_pdf(self):
+        self.request(self.client, 'get', DOWNLOAD_URL, format='pdf')
+
+    def shopping_list_txt(self):
+        self.request(self.client, 'get', DOWNLOAD_URL, format='txt')
+
+    def ingredient_search(self):
+        self.request(self.client, 'get', '/api/ingredients/', name=self.term)
+
+    def what_can_i_cook(self):
+        self.request(self.client, 'get', '/api/recipes/cook/',
+                     ingredients=self.pantry)
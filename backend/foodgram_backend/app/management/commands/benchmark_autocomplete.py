@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingredient_index import ingredient_index
+from app.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Замер времени поиска по индексу автодополнения ингредиентов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=float, default=1.0,
+                            help='Допустимый p99 в миллисекундах.')
+        parser.add_argument('--prefix-length', type=int, default=3)
+
+    def handle(self, *args, **options):
+        ingredient_index.ensure_built()
+        names = Ingredient.objects.values_list('name', flat=True)
+        terms = sorted({
+            name[:length].lower()
+            for name in names
+            for length in range(1, options['prefix_length'] + 1)
+        })
+        if not terms:
+            raise CommandError('Справочник ингредиентов пуст.')
+        timings = []
+        for term in terms:
+            start = time.perf_counter()
+            ingredient_index.search(term)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'Запросов: {len(timings)}, p50: {p50:.3f} мс, '
+            f'p99: {p99:.3f} мс, max: {timings[-1]:.3f} мс'
+        )
+        if p99 > options['budget']:
+            raise CommandError(
+                f'p99 {p99:.3f} мс превышает бюджет {options["budget"]} мс.'
+            )
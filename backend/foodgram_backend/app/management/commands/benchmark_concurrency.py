@@ -0,0 +1,100 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=50',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/recipes/download_shopping_cart/?format=pdf',
+    '/api/recipes/download_shopping_cart/?format=txt',
+)
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пропускной способности запущенных серверов при '
+            'параллельной нагрузке, например gunicorn с синхронными '
+            'воркерами и с воркерами uvicorn.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+',
+                            help='Базовые адреса серверов для сравнения.')
+        parser.add_argument('--token', type=str,
+                            help='Токен пользователя с подписками и корзиной.')
+        parser.add_argument('--concurrency', type=int, action='append',
+                            help='Число параллельных клиентов, можно '
+                                 'указать несколько раз.')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на каждый путь.')
+        parser.add_argument('--path', action='append',
+                            help='Проверяемые пути вместо набора '
+                                 'по умолчанию.')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', type=str,
+                            help='Сохранить результаты в JSON-файл.')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        results = []
+        for concurrency in options['concurrency'] or [1, 16, 64]:
+            for path in options['path'] or PATHS:
+                for base_url in options['urls']:
+                    result = self.run(
+                        base_url.rstrip('/') + path, headers, concurrency,
+                        options['requests'], options['timeout']
+                    )
+                    result.update(
+                        server=base_url, path=path, concurrency=concurrency
+                    )
+                    results.append(result)
+                    self.stdout.write(
+                        f'{base_url:<28} {path:<48} x{concurrency:<4} '
+                        f'{result["rps"]:8.1f} rps  '
+                        f'p50 {result["p50"]:8.1f} мс  '
+                        f'p99 {result["p99"]:8.1f} мс  '
+                        f'ошибок {result["errors"]}'
+                    )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    def fetch(self, url, headers, timeout):
+        """Запрос с чтением тела целиком, возвращаем время или None."""
+        start = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers),
+                         timeout=timeout) as response:
+                while response.read(64 * 1024):
+                    pass
+        except (HTTPError, URLError, OSError):
+            return None
+        return time.perf_counter() - start
+
+    def run(self, url, headers, concurrency, count, timeout):
+        if self.fetch(url, headers, timeout) is None:
+            raise CommandError(f'Сервер не отвечает на {url}.')
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            timings = list(executor.map(
+                lambda _: self.fetch(url, headers, timeout), range(count)
+            ))
+        elapsed = time.perf_counter() - start
+        ok = sorted(timing for timing in timings if timing is not None)
+        if not ok:
+            raise CommandError(f'Все запросы к {url} завершились ошибкой.')
+        return {
+            'rps': len(ok) / elapsed,
+            'p50': percentile(ok, 0.5) * 1000,
+            'p99': percentile(ok, 0.99) * 1000,
+            'errors': count - len(ok),
+        }
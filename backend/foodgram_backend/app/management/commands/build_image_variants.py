@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.images import build_variants
+from app.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Построение вариантов картинок рецептов, для которых их ещё '
+            'нет: после импорта данных или потери фоновых задач при '
+            'перезапуске.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Перестроить варианты для всех рецептов.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        built = failed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            if build_variants(recipe_id):
+                built += 1
+            else:
+                failed += 1
+        self.stdout.write(f'Построено: {built}, с ошибками: {failed}.')
@@ -0,0 +1,139 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.models import (
+    Recipe, RecipeCart, RecipeFavorite, RecipeTag, Subscription, Tag
+)
+from users.models import CustomUser
+
+
+# На маленьких таблицах планировщик справедливо выбирает полное чтение,
+# поэтому планы проверяем только на данных, близких к боевым.
+MIN_RECIPES = 1000
+
+
+def hot_queries():
+    """Запросы из api/views и filters и индексы, которые они должны читать.
+
+    Подходящим считается любой из перечисленных индексов: флаги
+    избранного и корзины, например, обслуживает и уникальное ограничение
+    (recipe, user), и индекс (user, recipe).
+    """
+    user = CustomUser.objects.order_by('id').first()
+    user_id = user.id if user else 1
+    tag = Tag.objects.order_by('id').first()
+    slug = tag.slug if tag else 'breakfast'
+    recipe = Recipe.objects.order_by('id').first()
+    recipe_id = recipe.id if recipe else 1
+    return {
+        'Лента рецептов': (
+            Recipe.objects.order_by('-pub_date', '-id')[:10],
+            ('recipe_pub_date_id_idx',)
+        ),
+        'Популярные рецепты': (
+            Recipe.objects.order_by(
+                '-favorites_count', '-pub_date', '-id'
+            )[:10],
+            ('recipe_popular_idx',)
+        ),
+        'Рецепты в трендах': (
+            Recipe.objects.order_by(
+                '-trending_score', '-pub_date', '-id'
+            )[:10],
+            ('recipe_trending_idx',)
+        ),
+        'Рецепты автора в подписках': (
+            Recipe.objects.filter(
+                author_id=user_id
+            ).order_by('-pub_date')[:3],
+            ('recipe_author_pub_date_idx',)
+        ),
+        'Фильтр по тегу': (
+            RecipeTag.objects.filter(tag__slug=slug).values('recipe_id'),
+            ('recipetag_tag_recipe_idx',)
+        ),
+        'Избранное пользователя': (
+            RecipeFavorite.objects.filter(
+                user_id=user_id
+            ).values('recipe_id'),
+            ('recipefavorite_user_recipe_idx',)
+        ),
+        'Флаг is_favorited': (
+            RecipeFavorite.objects.filter(
+                user_id=user_id, recipe_id=recipe_id
+            ),
+            ('recipefavorite_user_recipe_idx', 'unique_recipe_favorite')
+        ),
+        'Корзина пользователя': (
+            RecipeCart.objects.filter(user_id=user_id).values('recipe_id'),
+            ('recipecart_user_recipe_idx',)
+        ),
+        'Флаг is_in_shopping_cart': (
+            RecipeCart.objects.filter(user_id=user_id, recipe_id=recipe_id),
+            ('recipecart_user_recipe_idx', 'unique_recipe_cart')
+        ),
+        'Подписки пользователя': (
+            Subscription.objects.filter(
+                user_id=user_id
+            ).values('following_id'),
+            ('unique_follow',)
+        ),
+    }
+
+
+def physical_index(model, name):
+    """Имя индекса в БД для индекса или ограничения модели.
+
+    SQLite создаёт индекс под UNIQUE-ограничение со своим именем
+    sqlite_autoindex_*, находим его по столбцам ограничения.
+    """
+    constraint = next((
+        constraint for constraint in model._meta.constraints
+        if constraint.name == name
+    ), None)
+    if connection.vendor != 'sqlite' or constraint is None:
+        return name
+    columns = [
+        model._meta.get_field(field).column for field in constraint.fields
+    ]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA index_list({table})')
+        for _, index, _, origin, _ in cursor.fetchall():
+            if origin != 'u':
+                continue
+            cursor.execute(f'PRAGMA index_info({index})')
+            if [row[2] for row in cursor.fetchall()] == columns:
+                return index
+    return name
+
+
+class Command(BaseCommand):
+    help = ('Проверка планов основных запросов на данных из generate_data: '
+            'падает, если запрос не читает ожидаемый индекс.')
+
+    def handle(self, *args, **options):
+        if Recipe.objects.count() < MIN_RECIPES:
+            raise CommandError(
+                f'Нужно хотя бы {MIN_RECIPES} рецептов, '
+                f'запустите generate_data.'
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        failed = []
+        for name, (queryset, indexes) in hot_queries().items():
+            plan = queryset.explain()
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}:\n{plan}\n')
+            if not any(
+                    physical_index(queryset.model, index) in plan
+                    for index in indexes):
+                failed.append(f'{name} (ожидался {" или ".join(indexes)})')
+        if failed:
+            raise CommandError(
+                'Запросы не используют индексы: ' + ', '.join(failed)
+            )
+        self.stdout.write(
+            self.style.SUCCESS('Все запросы используют индексы.')
+        )
@@ -0,0 +1,163 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .parsers.model_parsers import (
+    BATCH_SIZE, cart_parser, favorite_parser, recipe_parser,
+    subscription_parser, tag_parser, user_parser
+)
+from api.cook_index import record_changes
+from app.counters import repair_counters
+from app.search import rebuild_search_index
+from app.models import IngredientUnit
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Выпечка', 'bakery', '#D2B48C'),
+    ('Десерт', 'dessert', '#FF69B4'),
+    ('Постное', 'vegan', '#2E8B57'),
+)
+PASSWORD = 'foodgram-bench'
+
+
+def zipf_weights(count, exponent=1.1):
+    """Веса "длинного хвоста": немногие элементы популярнее остальных."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = ('Генерация детерминированного набора данных для нагрузочного '
+            'тестирования: пользователи, рецепты, подписки, избранное и '
+            'корзины. Справочник ингредиентов должен быть загружен '
+            'заранее через import_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--output', type=str,
+                            help='Вместо записи в БД сохранить JSONL-файлы '
+                                 'для import_data с этим префиксом: '
+                                 'по файлу <префикс><модель>.jsonl на '
+                                 'каждую модель.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        if options['output'] == '-':
+            raise CommandError(
+                'import_data читает одну модель за раз, укажите префикс '
+                'файлов вместо "-".'
+            )
+        ingredients = list(IngredientUnit.objects.order_by('id').values_list(
+            'name__name', 'measurement_unit__name'
+        ))
+        if not ingredients:
+            raise CommandError('Сначала загрузите ингредиенты: '
+                               'import_data --model ingredient.')
+        self.random = random.Random(options['seed'])
+        users = [f'bench_user{number}' for number in range(options['users'])]
+        authors_weights = zipf_weights(len(users))
+        recipes = [
+            self.make_recipe(number, users, authors_weights, ingredients)
+            for number in range(options['recipes'])
+        ]
+        recipe_weights = zipf_weights(len(recipes))
+        datasets = (
+            ('tag', tag_parser, [
+                {'name': name, 'slug': slug, 'color': color}
+                for name, slug, color in DEFAULT_TAGS
+            ]),
+            ('user', user_parser, [
+                {'username': username, 'email': f'{username}@example.com',
+                 'first_name': 'Bench', 'last_name': username,
+                 'password': PASSWORD}
+                for username in users
+            ]),
+            ('recipe', recipe_parser, recipes),
+            ('subscription', subscription_parser, [
+                {'user': user, 'following': following}
+                for user in users
+                for following in self.sample(
+                    users, authors_weights, options['follows'], exclude=user
+                )
+            ]),
+            ('favorite', favorite_parser, self.user_recipes(
+                users, recipes, recipe_weights, options['favorites']
+            )),
+            ('cart', cart_parser, self.user_recipes(
+                users, recipes, recipe_weights, options['cart']
+            )),
+        )
+        for model, parser, records in datasets:
+            start = time.perf_counter()
+            if options['output']:
+                self.dump(options['output'], model, records)
+                continue
+            count = parser(records, options['batch_size'])
+            self.stderr.write(
+                f'{model}: {count} записей за '
+                f'{time.perf_counter() - start:.2f} с.'
+            )
+        if not options['output']:
+            repair_counters()
+            rebuild_search_index()
+            record_changes()
+
+    def sample(self, population, weights, count, exclude=None):
+        """Взвешенная выборка без повторов."""
+        count = min(count, len(population) - (exclude is not None))
+        result = set()
+        while len(result) < count:
+            choice = self.random.choices(population, weights)[0]
+            if choice != exclude:
+                result.add(choice)
+        return sorted(result)
+
+    def make_recipe(self, number, users, authors_weights, ingredients):
+        tags = [slug for _, slug, _ in DEFAULT_TAGS]
+        chosen = self.sample(
+            range(len(ingredients)), zipf_weights(len(ingredients), 0.8),
+            self.random.randint(3, 12)
+        )
+        return {
+            'author': self.random.choices(users, authors_weights)[0],
+            'name': f'Рецепт №{number}',
+            'text': 'Сгенерированный рецепт для нагрузочного тестирования.',
+            'cooking_time': self.random.randint(5, 180),
+            'image': 'recipes/images/bench.png',
+            'tags': self.sample(
+                tags, zipf_weights(len(tags)), self.random.randint(1, 3)
+            ),
+            'ingredients': [
+                {'name': ingredients[index][0],
+                 'measurement_unit': ingredients[index][1],
+                 'amount': self.random.randint(1, 500)}
+                for index in chosen
+            ],
+        }
+
+    def user_recipes(self, users, recipes, weights, count):
+        """Связи пользователь-рецепт с перекосом к популярным рецептам."""
+        return [
+            {'user': user, 'author': recipes[index]['author'],
+             'recipe': recipes[index]['name']}
+            for user in users
+            for index in self.sample(range(len(recipes)), weights, count)
+        ]
+
+    def dump(self, prefix, model, records):
+        with open(f'{prefix}{model}.jsonl', 'w', encoding='utf-8') as stream:
+            for record in records:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -1,18 +1,75 @@
-from django.core.management.base import BaseCommand
+import os
+import time
 
-from .parsers.model_parsers import ingredient_parser
+from django.core.management.base import BaseCommand, CommandError
+
+from .parsers.file_parsers import FILE_PARSERS, open_source
+from api.cook_index import record_changes
+from app.counters import repair_counters
+from app.search import rebuild_search_index
+from .parsers.model_parsers import (
+    BATCH_SIZE, CSV_FIELDS, cart_parser, favorite_parser, ingredient_parser,
+    recipe_parser, subscription_parser, tag_parser, user_parser
+)
 
 
 class Command(BaseCommand):
-    help = 'Импорт данных в БД из csv файлов.'
+    help = ('Импорт данных в БД из csv, json и jsonl файлов или stdin. '
+            'Пользователи и рецепты задаются по username и паре '
+            'автор-название.')
 
     HANDLERS = {
         'ingredient': ingredient_parser,
+        'tag': tag_parser,
+        'user': user_parser,
+        'recipe': recipe_parser,
+        'favorite': favorite_parser,
+        'cart': cart_parser,
+        'subscription': subscription_parser,
     }
+    # Пакетная вставка минует счётчики и поисковый индекс, их
+    # пересчитываем после импорта.
+    COUNTED = {'recipe', 'favorite', 'cart', 'subscription'}
 
     def add_arguments(self, parser):
-        parser.add_argument('--model', nargs='?', type=str, action='store')
-        parser.add_argument('--file', nargs='?', type=str, action='store')
+        parser.add_argument('--model', nargs='?', type=str, action='store',
+                            choices=sorted(Command.HANDLERS))
+        parser.add_argument('--file', nargs='?', type=str, action='store',
+                            help='Путь к файлу или "-" для чтения из stdin.')
+        parser.add_argument('--format', type=str, choices=sorted(FILE_PARSERS),
+                            help='По умолчанию - по расширению файла, '
+                                 'для stdin - jsonl.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def get_format(self, options):
+        if options['format']:
+            return options['format']
+        if options['file'] == '-':
+            return 'jsonl'
+        extension = os.path.splitext(options['file'])[1].lstrip('.').lower()
+        if extension not in FILE_PARSERS:
+            raise CommandError(
+                'Не удалось определить формат, укажите --format.'
+            )
+        return extension
 
     def handle(self, *args, **options):
-        Command.HANDLERS[options['model']](options['file'])
+        if not options['model'] or not options['file']:
+            raise CommandError('Укажите --model и --file.')
+        file_parser = FILE_PARSERS[self.get_format(options)]
+        start = time.perf_counter()
+        with open_source(options['file']) as stream:
+            records = file_parser(stream, CSV_FIELDS.get(options['model']))
+            count = Command.HANDLERS[options['model']](
+                records, options['batch_size']
+            )
+        if options['model'] in Command.COUNTED:
+            repair_counters()
+        if options['model'] == 'recipe':
+            rebuild_search_index()
+            record_changes()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'Импортировано записей: {count} за {elapsed:.2f} с '
+            f'({count / elapsed:.0f} записей/с).'
+        )
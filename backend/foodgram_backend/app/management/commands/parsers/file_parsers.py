@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+CHUNK_SIZE = 64 * 1024
+
+
+@contextmanager
+def open_source(file):
+    """Открываем файл относительно BASE_DIR или stdin, если задан "-"."""
+    if file == '-':
+        yield sys.stdin
+        return
+    file_path = os.path.join(settings.BASE_DIR, file)
+    with open(file_path, newline='', encoding='utf-8') as f:
+        yield f
+
+
+def csv_parser(stream, fields):
+    """Выносим общий для всех парсеров функционал по csv.
+
+    Строки читаются потоково и превращаются в словари по списку полей.
+    """
+    if fields is None:
+        raise CommandError('Для этой модели CSV не поддерживается.')
+    for row in csv.reader(stream):
+        if row:
+            yield dict(zip(fields, row))
+
+
+def jsonl_parser(stream, fields=None):
+    """Парсер JSON Lines: по объекту на строку."""
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Строка {number}: {error}')
+
+
+def json_parser(stream, fields=None):
+    """Потоковый парсер JSON-массива объектов.
+
+    Объекты разбираются по мере чтения файла кусками, поэтому большой
+    массив не загружается в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив объектов.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield obj
+        buffer = buffer[position:]
+    raise CommandError('JSON-массив оборван или содержит ошибку.')
+
+
+FILE_PARSERS = {
+    'csv': csv_parser,
+    'json': json_parser,
+    'jsonl': jsonl_parser,
+}
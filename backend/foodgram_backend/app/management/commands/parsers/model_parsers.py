@@ -1,32 +1,268 @@
-import csv
-import os
+from functools import partial
+from itertools import islice
 
-from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import transaction
 
-from app.models import Ingredient, MeasurementUnit
+from app.models import (
+    Ingredient, IngredientUnit, MeasurementUnit, Recipe, RecipeCart,
+    RecipeFavorite, RecipeIngredient, RecipeTag, Subscription, Tag
+)
 
+User = get_user_model()
 
-def csv_parser(file):
-    """Выносим общий для всех парсеров функционал по csv."""
-    file_path = os.path.join(settings.BASE_DIR, file)
-    result = []
-    with open(file_path, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            result.append(row)
-    return result
+BATCH_SIZE = 500
 
+CSV_FIELDS = {
+    'ingredient': ('name', 'measurement_unit'),
+    'tag': ('name', 'slug', 'color'),
+    'user': ('username', 'email', 'first_name', 'last_name', 'password'),
+    'favorite': ('user', 'author', 'recipe'),
+    'cart': ('user', 'author', 'recipe'),
+    'subscription': ('user', 'following'),
+}
 
-def ingredient_parser(file):
+
+def batches(rows, batch_size):
+    """Разбиваем поток записей на пачки фиксированного размера."""
+    rows = iter(rows)
+    batch = list(islice(rows, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, batch_size))
+
+
+def import_records(records, import_batch, batch_size):
+    """Импортируем записи пачками в одной транзакции, возвращаем их число."""
+    count = 0
+    with transaction.atomic():
+        for batch in batches(records, batch_size):
+            import_batch(batch)
+            count += len(batch)
+    return count
+
+
+def resolve(mapping, key, name):
+    try:
+        return mapping[key]
+    except KeyError:
+        raise CommandError(f'{name} не найден: {key}')
+
+
+def get_user_ids(usernames):
+    return dict(User.objects.filter(
+        username__in=set(usernames)
+    ).values_list('username', 'id'))
+
+
+def get_recipe_ids(keys):
+    """id рецептов по паре (id автора, название)."""
+    recipes = Recipe.objects.filter(
+        author_id__in={author_id for author_id, _ in keys},
+        name__in={name for _, name in keys}
+    ).values_list('author_id', 'name', 'id')
+    return {(author_id, name): pk for author_id, name, pk in recipes}
+
+
+def import_ingredient_batch(records, units):
+    """Импорт пачки записей "ингредиент, единица измерения".
+
+    Повторный запуск безопасен: существующие записи пропускаются.
+    """
+    rows = [(record['name'], record['measurement_unit'])
+            for record in records]
+    new_units = {unit for _, unit in rows} - units.keys()
+    if new_units:
+        MeasurementUnit.objects.bulk_create(
+            [MeasurementUnit(name=unit) for unit in new_units],
+            ignore_conflicts=True
+        )
+        units.update(MeasurementUnit.objects.filter(
+            name__in=new_units
+        ).values_list('name', 'id'))
+    names = {name for name, _ in rows}
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name) for name in names], ignore_conflicts=True
+    )
+    ingredients = dict(Ingredient.objects.filter(
+        name__in=names
+    ).values_list('name', 'id'))
+    existing = set(IngredientUnit.objects.filter(
+        name_id__in=ingredients.values()
+    ).values_list('name_id', 'measurement_unit_id'))
+    pairs = {(ingredients[name], units[unit]) for name, unit in rows}
+    IngredientUnit.objects.bulk_create([
+        IngredientUnit(name_id=ingredient_id, measurement_unit_id=unit_id)
+        for ingredient_id, unit_id in pairs - existing
+    ])
+
+
+def import_tag_batch(records):
+    Tag.objects.bulk_create([
+        Tag(name=record['name'], slug=record['slug'], color=record['color'])
+        for record in records
+    ], ignore_conflicts=True)
+
+
+def import_user_batch(records, passwords):
+    """Импорт пользователей; одинаковые пароли хешируются один раз."""
+    users = []
+    for record in records:
+        password = record.get('password')
+        if password not in passwords:
+            passwords[password] = make_password(password)
+        users.append(User(
+            username=record['username'],
+            email=record['email'],
+            first_name=record.get('first_name', ''),
+            last_name=record.get('last_name', ''),
+            password=passwords[password]
+        ))
+    User.objects.bulk_create(users, ignore_conflicts=True)
+
+
+def import_recipe_batch(records, tags):
+    """Импорт рецептов вместе с тегами и ингредиентами.
+
+    Рецепт определяется парой автор-название, уже существующие рецепты
+    пропускаются.
+    """
+    authors = get_user_ids(record['author'] for record in records)
+    recipes = {}
+    for record in records:
+        author_id = resolve(authors, record['author'], 'Автор')
+        recipes[(author_id, record['name'])] = record
+    existing = get_recipe_ids(recipes.keys()).keys()
+    new = {key: recipes[key] for key in recipes.keys() - existing}
+    Recipe.objects.bulk_create([
+        Recipe(author_id=author_id, name=name, text=record['text'],
+               cooking_time=record['cooking_time'],
+               image=record.get('image', ''))
+        for (author_id, name), record in new.items()
+    ])
+    recipe_ids = get_recipe_ids(new.keys())
+    units = {}
+    names = {ingredient['name']
+             for record in new.values()
+             for ingredient in record.get('ingredients', ())}
+    for pk, name, unit in IngredientUnit.objects.filter(
+            name__name__in=names
+    ).values_list('id', 'name__name', 'measurement_unit__name'):
+        units[(name, unit)] = pk
+    links = {
+        (recipe_ids[key], resolve(
+            units, (ingredient['name'], ingredient['measurement_unit']),
+            'Ингредиент'
+        ), int(ingredient['amount']))
+        for key, record in new.items()
+        for ingredient in record.get('ingredients', ())
+    }
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(ingredient_id=unit_id, amount=amount)
+        for unit_id, amount in {(unit, amount) for _, unit, amount in links}
+    ], ignore_conflicts=True)
+    recipe_ingredients = {
+        (unit_id, amount): pk
+        for pk, unit_id, amount in RecipeIngredient.objects.filter(
+            ingredient_id__in={unit for _, unit, _ in links},
+            amount__in={amount for _, _, amount in links}
+        ).values_list('id', 'ingredient_id', 'amount')
+    }
+    through = Recipe.ingredient.through
+    through.objects.bulk_create([
+        through(recipe_id=recipe_id,
+                recipeingredient_id=recipe_ingredients[(unit_id, amount)])
+        for recipe_id, unit_id, amount in links
+    ], ignore_conflicts=True)
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe_id=recipe_ids[key], tag_id=resolve(tags, slug, 'Тег'))
+        for key, record in new.items()
+        for slug in set(record.get('tags', ()))
+    ])
+
+
+def import_user_recipe_batch(records, model):
+    """Импорт связей пользователь-рецепт: избранного или корзины."""
+    users = get_user_ids(
+        username
+        for record in records
+        for username in (record['user'], record['author'])
+    )
+    keys = {
+        (resolve(users, record['user'], 'Пользователь'),
+         resolve(users, record['author'], 'Автор'), record['recipe'])
+        for record in records
+    }
+    recipe_ids = get_recipe_ids({(author, name) for _, author, name in keys})
+    model.objects.bulk_create([
+        model(user_id=user_id,
+              recipe_id=resolve(recipe_ids, (author_id, name), 'Рецепт'))
+        for user_id, author_id, name in keys
+    ], ignore_conflicts=True)
+
+
+def import_subscription_batch(records):
+    users = get_user_ids(
+        username
+        for record in records
+        for username in (record['user'], record['following'])
+    )
+    Subscription.objects.bulk_create([
+        Subscription(
+            user_id=resolve(users, record['user'], 'Пользователь'),
+            following_id=resolve(users, record['following'], 'Автор')
+        )
+        for record in records
+    ], ignore_conflicts=True)
+
+
+def ingredient_parser(records, batch_size=BATCH_SIZE):
     """Парсер для модели ингредиентов."""
-    rows = csv_parser(file)
-    units = set([row[1] for row in rows])
-    objs = [MeasurementUnit(name=unit) for unit in units]
-    MeasurementUnit.objects.bulk_create(objs)
-    for row in rows:
-        measurement_unit = get_object_or_404(MeasurementUnit, name=row[1])
-        obj, created = Ingredient.objects.get_or_create(name=row[0])
-        print(row[0])
-        obj.measurement_unit.add(measurement_unit)
-        obj.save()
+    units = dict(MeasurementUnit.objects.values_list('name', 'id'))
+    return import_records(
+        records, partial(import_ingredient_batch, units=units), batch_size
+    )
+
+
+def tag_parser(records, batch_size=BATCH_SIZE):
+    """Парсер для модели тегов."""
+    return import_records(records, import_tag_batch, batch_size)
+
+
+def user_parser(records, batch_size=BATCH_SIZE):
+    """Парсер для модели пользователей."""
+    return import_records(
+        records, partial(import_user_batch, passwords={}), batch_size
+    )
+
+
+def recipe_parser(records, batch_size=BATCH_SIZE):
+    """Парсер для рецептов с тегами и ингредиентами."""
+    tags = dict(Tag.objects.values_list('slug', 'id'))
+    return import_records(
+        records, partial(import_recipe_batch, tags=tags), batch_size
+    )
+
+
+def favorite_parser(records, batch_size=BATCH_SIZE):
+    """Парсер для избранного."""
+    return import_records(
+        records,
+        partial(import_user_recipe_batch, model=RecipeFavorite),
+        batch_size
+    )
+
+
+def cart_parser(records, batch_size=BATCH_SIZE):
+    """Парсер для корзины покупок."""
+    return import_records(
+        records, partial(import_user_recipe_batch, model=RecipeCart),
+        batch_size
+    )
+
+
+def subscription_parser(records, batch_size=BATCH_SIZE):
+    """Парсер для подписок."""
+    return import_records(records, import_subscription_batch, batch_size)
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт поисковых документов всех рецептов, например после '
+            'импорта или переименования ингредиентов.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            count = rebuild_search_index()
+        self.stdout.write(
+            f'Проиндексировано рецептов: {count} за '
+            f'{time.perf_counter() - start:.2f} с.'
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api import feed_cache
+from app.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = ('Обновление рейтинга трендов по новым добавлениям в избранное '
+            'и корзины. Запускается периодически, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать рейтинг по всем событиям.')
+
+    def handle(self, *args, **options):
+        updated = refresh_trending(options['full'])
+        if updated:
+            feed_cache.bump_generation()
+        self.stdout.write(f'Обновлено рецептов: {updated}.')
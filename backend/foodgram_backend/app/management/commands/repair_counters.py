@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт денормализованных счётчиков избранного, корзин, '
+            'рецептов и подписчиков с исправлением расхождений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = repair_counters(options['dry_run'])
+        for counter, count in drift.items():
+            self.stdout.write(f'{counter}: расхождений {count}')
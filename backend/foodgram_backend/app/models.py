@@ -1,8 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.db.models import UniqueConstraint
+from django.utils import timezone
 
-from users.models import CustomUser
+from users.models import CounterFieldsMixin, CustomUser
 
 
 class MeasurementUnit(models.Model):
@@ -99,7 +101,7 @@ class RecipeIngredient(models.Model):
         ]
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """Описание модели для рецептов."""
 
     author = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
@@ -110,6 +112,9 @@ class Recipe(models.Model):
     text = models.TextField(verbose_name='Описание рецепта')
     image = models.ImageField(upload_to='recipes/images/',
                               verbose_name='Изображение')
+    image_variants = models.JSONField(default=dict, blank=True,
+                                      editable=False,
+                                      verbose_name='Варианты изображения')
     tag = models.ManyToManyField(Tag,
                                  related_name='recipes',
                                  through='RecipeTag',
@@ -118,9 +123,34 @@ class Recipe(models.Model):
     ingredient = models.ManyToManyField(RecipeIngredient,
                                         related_name='recipes',
                                         verbose_name='Ингредиенты')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В корзинах'
+    )
+    trending_score = models.FloatField(
+        default=0, editable=False, verbose_name='Рейтинг в трендах'
+    )
+    search_vector = SearchVectorField(
+        null=True, editable=False, verbose_name='Поисковый вектор'
+    )
+    counter_fields = (
+        'favorites_count', 'carts_count', 'trending_score', 'search_vector'
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-favorites_count', '-pub_date', '-id'],
+                         name='recipe_popular_idx'),
+            models.Index(fields=['-trending_score', '-pub_date', '-id'],
+                         name='recipe_trending_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -141,6 +171,12 @@ class RecipeTag(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tag', 'recipe'],
+                         name='recipetag_tag_recipe_idx'),
+        ]
+
 
 class RecipeFavorite(models.Model):
     """Таблица для любимых рецептов."""
@@ -153,6 +189,8 @@ class RecipeFavorite(models.Model):
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
                              verbose_name='Автор')
+    created = models.DateTimeField(default=timezone.now,
+                                   verbose_name='Добавлено')
 
     class Meta:
         constraints = [
@@ -161,6 +199,10 @@ class RecipeFavorite(models.Model):
                 name='unique_recipe_favorite'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'],
+                         name='recipefavorite_user_recipe_idx'),
+        ]
 
 
 class RecipeCart(models.Model):
@@ -174,6 +216,8 @@ class RecipeCart(models.Model):
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
                              verbose_name='Автор')
+    created = models.DateTimeField(default=timezone.now,
+                                   verbose_name='Добавлено')
 
     class Meta:
         constraints = [
@@ -182,3 +226,19 @@ class RecipeCart(models.Model):
                 name='unique_recipe_cart'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'recipe'],
+                         name='recipecart_user_recipe_idx'),
+        ]
+
+
+class ScoreWatermark(models.Model):
+    """Последнее событие источника, учтённое в рейтинге трендов."""
+
+    source = models.CharField(max_length=50, unique=True,
+                              verbose_name='Источник')
+    last_id = models.BigIntegerField(default=0,
+                                     verbose_name='Последний id')
+
+    def __str__(self):
+        return f'{self.source}: {self.last_id}'
@@ -0,0 +1,152 @@
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector
+)
+from django.db import connection, connections
+from django.db.models import F, OuterRef, Subquery
+
+from .models import Recipe
+
+SEARCH_CONFIG = 'russian'
+SEARCH_INDEX = 'recipe_search_idx'
+FTS_TABLE = 'app_recipe_fts'
+# Веса полей: название важнее ингредиентов, ингредиенты важнее описания.
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+BATCH_SIZE = 1000
+# Окончания, которые отбрасываем перед поиском по префиксу в FTS5.
+VOWEL_ENDING = re.compile(r'[аеёиоуыэюяйь]+$')
+MIN_STEM_LENGTH = 3
+INGREDIENT_NAME = 'recipeingredient__ingredient__name__name'
+
+
+def create_search_index(using='default', **kwargs):
+    """Создаём поисковый индекс после migrate.
+
+    GIN-индекс и виртуальная таблица FTS5 специфичны для СУБД, поэтому
+    их нет в Meta модели: в Postgres индексируем поле search_vector,
+    в SQLite для локального запуска держим копию документов в FTS5.
+    """
+    target = connections[using]
+    with target.cursor() as cursor:
+        if target.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON '
+                f'{Recipe._meta.db_table} USING gin (search_vector)'
+            )
+        elif target.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                f"fts5(name, ingredients, text, "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+
+
+def ingredient_names():
+    """Подзапрос с названиями ингредиентов текущего рецепта."""
+    return Subquery(
+        Recipe.ingredient.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        ).order_by().values('recipe_id').annotate(
+            names=StringAgg(INGREDIENT_NAME, ' ')
+        ).values('names')
+    )
+
+
+def get_documents(recipe_ids):
+    """Название, ингредиенты и описание рецептов для индекса FTS5."""
+    names = defaultdict(list)
+    for recipe_id, name in Recipe.ingredient.through.objects.filter(
+            recipe_id__in=recipe_ids
+    ).values_list('recipe_id', INGREDIENT_NAME):
+        names[recipe_id].append(name)
+    return [
+        (pk, name, ' '.join(names[pk]), text)
+        for pk, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('id', 'name', 'text')
+    ]
+
+
+def update_search_index(recipe_ids):
+    """Пересчитываем поисковые документы рецептов.
+
+    Вызывается из сигналов api.signals после коммита записи рецепта,
+    когда его ингредиенты уже сохранены. Для удалённых рецептов убирает
+    их документы из FTS5.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+            SearchVector(F('name'), weight='A', config=SEARCH_CONFIG)
+            + SearchVector(ingredient_names(), weight='B',
+                           config=SEARCH_CONFIG)
+            + SearchVector(F('text'), weight='C', config=SEARCH_CONFIG)
+        ))
+    elif connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids
+            )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+                f'VALUES (%s, %s, %s, %s)',
+                get_documents(recipe_ids)
+            )
+
+
+def rebuild_search_index():
+    """Пересчитываем документы всех рецептов, возвращаем их число."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    recipe_ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+    )
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        update_search_index(recipe_ids[start:start + BATCH_SIZE])
+    return len(recipe_ids)
+
+
+def fts_stem(word):
+    stem = VOWEL_ENDING.sub('', word.lower())
+    return stem if len(stem) >= MIN_STEM_LENGTH else word.lower()
+
+
+def fts_query(term):
+    """Запрос FTS5: каждое слово в кавычках и с поиском по префиксу.
+
+    Стеммера для русского в FTS5 нет, его приближённо заменяет префикс
+    слова без гласных на конце: "картофель" найдёт и "картофелем".
+    """
+    return ' '.join(
+        f'"{fts_stem(word)}"*' for word in re.findall(r'\w+', term)
+    )
+
+
+def search_recipes(queryset, term):
+    """Рецепты, подходящие под запрос, по убыванию релевантности."""
+    if not re.search(r'\w', term):
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(term, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    # MATCH выполняем один раз: соединяем рецепты с таблицей FTS5 и
+    # берём ранг из той же строки, а не подзапросом на каждый рецепт.
+    table = Recipe._meta.db_table
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    return queryset.extra(
+        select={'search_rank': f'-bm25({FTS_TABLE}, {weights})'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[fts_query(term)]
+    ).order_by('-search_rank', '-pub_date', '-id')
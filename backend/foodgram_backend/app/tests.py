@@ -0,0 +1,31 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .management.commands.check_query_plans import MIN_RECIPES
+from .models import Ingredient, IngredientUnit, MeasurementUnit
+
+
+class QueryPlansTest(TestCase):
+    """Основные запросы читают свои индексы на данных generate_data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        unit = MeasurementUnit.objects.create(name='г')
+        for number in range(50):
+            IngredientUnit.objects.create(
+                name=Ingredient.objects.create(name=f'Продукт {number}'),
+                measurement_unit=unit
+            )
+
+    def test_refuses_small_data(self):
+        with self.assertRaises(CommandError):
+            call_command('check_query_plans', stdout=StringIO())
+
+    def test_hot_queries_use_indexes(self):
+        call_command(
+            'generate_data', users=50, recipes=MIN_RECIPES, follows=5,
+            favorites=5, cart=2, stderr=StringIO()
+        )
+        call_command('check_query_plans', stdout=StringIO())
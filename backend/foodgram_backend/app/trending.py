@@ -0,0 +1,80 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Recipe, RecipeCart, RecipeFavorite, ScoreWatermark
+
+# Рейтинг хранится как логарифм суммы exp((t - EPOCH) / tau) по событиям.
+# Общий множитель затухания одинаков для всех рецептов и на порядок не
+# влияет, поэтому старые значения не нужно пересчитывать - новые события
+# просто добавляются к сумме.
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SOURCES = (
+    ('favorite', RecipeFavorite, 1.0),
+    ('cart', RecipeCart, 0.5),
+)
+# События моложе этой задержки ждут следующего запуска: так транзакция,
+# получившая меньший id, но ещё не зафиксированная, не будет пропущена.
+SETTLE_DELAY = timedelta(minutes=1)
+BATCH_SIZE = 1000
+
+
+def get_tau():
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+
+def add_scores(first, second):
+    """Логарифм суммы экспонент без переполнения."""
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def event_score(created, weight, tau):
+    return math.log(weight) + (created - EPOCH).total_seconds() / tau
+
+
+def refresh_trending(full=False):
+    """Учитываем в рейтинге трендов новые добавления в избранное и корзины.
+
+    При full рейтинг строится заново по всем событиям, так из него
+    уходят удалённые добавления. Возвращаем число обновлённых рецептов.
+    """
+    tau = get_tau()
+    cutoff = timezone.now() - SETTLE_DELAY
+    contributions = {}
+    with transaction.atomic():
+        if full:
+            Recipe.objects.update(trending_score=0)
+        for source, model, weight in SOURCES:
+            watermark, _ = ScoreWatermark.objects.select_for_update(
+            ).get_or_create(source=source)
+            if full:
+                watermark.last_id = 0
+            events = model.objects.filter(
+                id__gt=watermark.last_id
+            ).order_by('id').values_list('id', 'recipe_id', 'created')
+            for pk, recipe_id, created in events.iterator(BATCH_SIZE):
+                # Водяной знак не должен обогнать ещё не учтённое
+                # событие, поэтому останавливаемся на первом свежем.
+                if created >= cutoff:
+                    break
+                score = event_score(created, weight, tau)
+                if recipe_id in contributions:
+                    score = add_scores(contributions[recipe_id], score)
+                contributions[recipe_id] = score
+                watermark.last_id = pk
+            watermark.save(update_fields=['last_id'])
+        recipe_ids = list(contributions)
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            recipes = list(Recipe.objects.filter(
+                pk__in=recipe_ids[start:start + BATCH_SIZE]
+            ).only('id', 'trending_score'))
+            for recipe in recipes:
+                recipe.trending_score = add_scores(
+                    recipe.trending_score, contributions[recipe.id]
+                )
+            Recipe.objects.bulk_update(recipes, ['trending_score'])
+    return len(recipe_ids)
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +75,44 @@ DATABASES = {
     }
 }
 
+# LocMemCache по умолчанию свой у каждого процесса. Поколение ленты
+# (api.feed_cache) и журнал индекса подборки (api.cook_index) в нём видит
+# только записавший воркер: остальные отдают закешированную ленту до
+# FEED_CACHE_TIMEOUT, а индекс подхватывают полной перестройкой. При
+# нескольких воркерах gunicorn (WEB_CONCURRENCY) нужен общий кеш, например
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', 60 * 5))
+
+# Число воркеров gunicorn, он читает ту же переменную окружения.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+
+SLOW_REQUEST_THRESHOLD = int(os.getenv('SLOW_REQUEST_THRESHOLD', 500))
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+
+# По умолчанию метрики видят только администраторы. Адреса сборщика
+# добавляются явно; за прокси REMOTE_ADDR - это адрес прокси, поэтому его
+# указывать нельзя.
+METRICS_ALLOWED_IPS = [
+    address for address in os.getenv('METRICS_ALLOWED_IPS', '').split(',')
+    if address
+]
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -5,7 +5,7 @@ from .models import CustomUser
 
 class CustomUserAdmin(admin.ModelAdmin):
     """ Администрирование пользователей и их ролей."""
-    list_display = ('username', 'email',)
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
     list_filter = ('username', 'email')
     search_fields = ('username', 'email')
     ordering = ('username',)
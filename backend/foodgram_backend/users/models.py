@@ -2,11 +2,43 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class CustomUser(AbstractUser):
+class CounterFieldsMixin:
+    """Не перезаписываем при сохранении поля, которые считает БД.
+
+    Счётчики меняются только через UPDATE с F(), и у загруженного ранее
+    объекта их значения могут устареть. Поэтому полное сохранение
+    существующей записи пишет все поля, кроме counter_fields; явно
+    переданные update_fields сохраняются как есть.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     """Описываем кастомную модель пользователя."""
 
     email = models.EmailField(unique=True, max_length=254,
                               verbose_name='email')
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Число подписчиков'
+    )
+    counter_fields = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'password', 'first_name', 'last_name']
 